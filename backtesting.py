@@ -1,66 +1,269 @@
-import yfinance as yf
+import heapq
+from functools import reduce
+
+import numpy as np
 import pandas as pd
 
+from strategist import Strategist
+from market_data import YFinanceProvider
+from signals import signal_arrays, STOP_LOSS, TAKE_PROFIT, THRESHOLDS
+from indicators.moving_average import MovingAverage
+from indicators.rsi import RSI
+from indicators.macd import MACD
+from indicators.bollinger_bands import BollingerBands
+from indicators.stochastic_oscillator import StochasticOscillator
+from indicators.pivot_points import PivotPoints
+
+
+def daily_pivot_scores(data):
+    # Each bar is scored against the pivots of the previous session, exactly
+    # like Strategist does with its yesterday_data: constant within a day.
+    dates = data.index.normalize()
+    sessions = data.groupby(dates).agg(High=('High', 'max'), Low=('Low', 'min'), Close=('Close', 'last'))
+    max_value = sessions['High'].to_numpy()
+    min_value = sessions['Low'].to_numpy()
+    close = sessions['Close'].to_numpy()
+    pivot = (max_value + min_value + close) / 3
+    session_scores = PivotPoints.score(
+        close,
+        pivot,
+        2 * pivot - max_value,
+        pivot - (max_value - min_value),
+        min_value - 2 * (max_value - pivot),
+        2 * pivot - min_value,
+        pivot + (max_value - min_value),
+        max_value + 2 * (pivot - min_value),
+    )
+    previous = pd.Series(np.concatenate([[np.nan], session_scores[:-1]]), index=sessions.index)
+    return previous.reindex(dates).to_numpy()
+
+
+def indicator_score_history(data, windows):
+    # Per-indicator scores for every bar; windows is a Strategist.TERMS entry without period/interval
+    short_window, long_window, rsi_window, macd_short, macd_long, macd_signal = windows
+    ma = MovingAverage(data, short_window, long_window).calculate()
+    rsi = RSI(data, rsi_window).calculate()
+    macd = MACD(data, macd_short, macd_long, macd_signal).calculate()
+    bb = BollingerBands(data, 20).calculate()
+    so = StochasticOscillator(data, 14).calculate()
+    return {
+        'ma': MovingAverage.score(ma.values('short_mavg'), ma.values('long_mavg')),
+        'rsi': RSI.score(rsi.values('RSI')),
+        'macd': MACD.score(macd.values('MACD'), macd.values('Signal Line')),
+        'bb': BollingerBands.score(data['Close'].to_numpy(), bb.values('Upper Band'), bb.values('Lower Band'), bb.values('20_MA')),
+        'so': StochasticOscillator.score(so.values('%K')),
+        'pivot': daily_pivot_scores(data),
+    }
+
+
+def aggregate_history(indicator_scores, weights=None):
+    return Strategist.aggregate_scores(
+        indicator_scores['ma'], indicator_scores['rsi'], indicator_scores['macd'],
+        indicator_scores['bb'], indicator_scores['so'], indicator_scores['pivot'], weights=weights,
+    )
+
+
+def score_history(data, term='short', weights=None):
+    # Strategist.advice() for every bar at once: full indicator columns, then vectorized scores
+    return aggregate_history(indicator_score_history(data, Strategist.TERMS[term][2:]), weights)
+
+
+def first_passages(low, high, starts, lower, upper, window=64, max_cells=4_000_000):
+    # For every start, the first bar at or after it whose low/high range leaves (lower, upper), -1 if none;
+    # pass the close twice to test closes only. All starts are scanned together in blocks of bars whose
+    # length doubles each round.
+    exits = np.full(len(starts), -1)
+    pending = np.arange(len(starts))
+    offset = np.zeros(len(starts), dtype=np.int64)
+    while len(pending):
+        for chunk in np.array_split(pending, max(1, len(pending) * window // max_cells)):
+            bars = starts[chunk, None] + offset[chunk, None] + np.arange(window)
+            inside = bars < len(low)
+            clipped = np.minimum(bars, len(low) - 1)
+            hit = inside & ((low[clipped] <= lower[chunk, None]) | (high[clipped] >= upper[chunk, None]))
+            found = hit.any(axis=1)
+            exits[chunk[found]] = bars[found, hit[found].argmax(axis=1)]
+            offset[chunk] += window
+        pending = pending[(exits[pending] < 0) & (starts[pending] + offset[pending] < len(low))]
+        window *= 2
+    return exits
+
+
+def intrabar_exits(open_, high, low, close, exit_bars, lower, upper, long, ambiguous='path'):
+    # Fill price of each exit found on high/low: the level that was touched, or the open when the bar
+    # gapped through it. When one bar touches both levels, 'path' walks a synthetic tick path
+    # (O->L->H->C on up bars, O->H->L->C on down bars) and 'stop' assumes the stop came first.
+    bar = np.maximum(exit_bars, 0)
+    o, h, l, c = open_[bar], high[bar], low[bar], close[bar]
+    both = (l <= lower) & (h >= upper)
+    lower_first = np.select(
+        [o <= lower, o >= upper, both],
+        [True, False, c >= o if ambiguous == 'path' else long],
+        l <= lower,
+    )
+    prices = np.where(lower_first, np.minimum(o, lower), np.maximum(o, upper))
+    return np.where(exit_bars >= 0, prices, np.nan)
+
+
 class Backtesting:
-    def __init__(self, companies, start_date, end_date, initial_budget):
+    def __init__(self, companies, start_date, end_date, initial_budget, term='short', interval='1d',
+                 stop_loss=STOP_LOSS, take_profit=TAKE_PROFIT, thresholds=THRESHOLDS, intrabar=False, ambiguous='path',
+                 market_data=None):
         self.companies = companies
         self.start_date = start_date
         self.end_date = end_date
         self.initial_budget = initial_budget
-        self.portfolio = {company['ticker']: 0 for company in companies}  # Tracks quantity of each asset
+        self.term = term
+        self.interval = interval
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.thresholds = thresholds
+        # intrabar: stops and targets fire on each bar's high/low like live orders, not only on closes
+        self.intrabar = intrabar
+        self.ambiguous = ambiguous
+        self.market_data = market_data or YFinanceProvider()
+        self.data = {}
         self.cash = initial_budget
-        self.transaction_log = []
+        self.transaction_log = None
+        self.equity_curve = None
 
     def fetch_data(self, ticker):
-        data = yf.download(ticker, start=self.start_date, end=self.end_date)
-        return data
-
-    def simulate_trades(self):
-        for company in self.companies:
-            data = self.fetch_data(company['ticker'])
-            # Assume using close prices for simplicity
-            closing_prices = data['Close']
-            for date, price in closing_prices.iteritems():
-                # Your existing strategy here, simplified for demonstration
-                # Replace with your strategy's actual advice
-                advice = 'Buy'  # Placeholder, replace with call to your strategy
-                quantity = 0
-                if advice == "Strong Buy":
-                    quantity = self.cash * 0.04 / price
-                elif advice == "Buy":
-                    quantity = self.cash * 0.01 / price
-
-                if quantity > 0:
-                    self.buy(company['ticker'], quantity, price)
-                # Similar logic for sell signals
-                
-                # Log the transaction
-                self.transaction_log.append({
-                    'date': date,
-                    'ticker': company['ticker'],
-                    'action': advice,
-                    'quantity': quantity,
-                    'price': price,
-                    'value': quantity * price
-                })
-
-    def buy(self, ticker, quantity, price):
-        self.portfolio[ticker] += quantity
-        self.cash -= quantity * price
-
-    def sell(self, ticker, quantity, price):
-        if self.portfolio[ticker] >= quantity:
-            self.portfolio[ticker] -= quantity
-            self.cash += quantity * price
+        if ticker not in self.data:
+            self.data[ticker] = self.market_data.history(ticker, interval=self.interval, start=self.start_date, end=self.end_date)
+        return self.data[ticker]
+
+    def simulate_trades(self, scores=None):
+        # scores optionally maps ticker -> precomputed per-bar score array (used by the optimizer)
+        tickers = [company['ticker'] for company in self.companies]
+        frames = {ticker: self.fetch_data(ticker) for ticker in tickers}
+        frames = {ticker: frame for ticker, frame in frames.items() if not frame.empty}
+        tickers = [ticker for ticker in tickers if ticker in frames]
+        timeline = reduce(pd.Index.union, (frame.index for frame in frames.values())) if frames else pd.DatetimeIndex([])
+
+        # Vectorized part: scores, signals, stop/target exits and each ticker's bars on the shared timeline
+        prices = np.full((len(timeline), len(tickers)), np.nan)
+        candidates = []
+        for column, ticker in enumerate(tickers):
+            frame = frames[ticker]
+            close = frame['Close'].to_numpy(dtype=float)
+            position = timeline.get_indexer(frame.index)
+            prices[position, column] = close
+            ticker_scores = scores[ticker] if scores is not None else score_history(frame, self.term)
+            side, leverage, fraction = signal_arrays(ticker_scores, self.thresholds)
+            bars = np.flatnonzero((side != 0) & np.isfinite(close))
+            entry = close[bars]
+            long = side[bars] > 0
+            lower = np.where(long, entry * (1 - self.stop_loss), entry * (1 - self.take_profit))
+            upper = np.where(long, entry * (1 + self.take_profit), entry * (1 + self.stop_loss))
+            if self.intrabar:
+                low = frame['Low'].to_numpy(dtype=float)
+                high = frame['High'].to_numpy(dtype=float)
+                exit_bars = first_passages(low, high, bars + 1, lower, upper)
+                exit_price = intrabar_exits(frame['Open'].to_numpy(dtype=float), high, low, close, exit_bars, lower, upper, long, self.ambiguous)
+            else:
+                exit_bars = first_passages(close, close, bars + 1, lower, upper)
+                exit_price = np.where(exit_bars >= 0, close[exit_bars], np.nan)
+            candidates.append((
+                position[bars], np.full(len(bars), column), side[bars], leverage[bars], fraction[bars], entry,
+                np.where(exit_bars >= 0, position[exit_bars], -1), exit_price,
+            ))
+        prices = pd.DataFrame(prices).ffill().fillna(0.0).to_numpy()
+
+        # Same-bar signals are handled in watchlist order, like the live loop
+        entry_index, column, side, leverage, fraction, entry_price, exit_index, exit_price = (
+            np.concatenate(values) for values in zip(*candidates)
+        ) if candidates else (np.empty(0, dtype=int),) * 8
+        order = np.lexsort((column, entry_index))
+        entry_index, column, side, leverage, fraction, entry_price, exit_index, exit_price = (
+            values[order] for values in (entry_index, column, side, leverage, fraction, entry_price, exit_index, exit_price)
+        )
+        # What a closed position hands back per unit of budget spent on it (entry*q + leveraged gain)
+        payback = 1 + side * leverage * (exit_price / entry_price - 1)
+
+        # Event loop: only the running budget is sequential, since it sizes every new position
+        cash = self.initial_budget
+        spent = [0.0] * len(entry_index)
+        exits = []
+        for i, (t, share, exit_at, back) in enumerate(zip(entry_index.tolist(), fraction.tolist(), exit_index.tolist(), payback.tolist())):
+            while exits and exits[0][0] <= t:
+                cash += heapq.heappop(exits)[1]
+            if cash <= 0:
+                continue
+            spent[i] = cash * share
+            cash -= spent[i]
+            if exit_at >= 0:
+                heapq.heappush(exits, (exit_at, spent[i] * back))
+        while exits:
+            cash += heapq.heappop(exits)[1]
+        self.cash = cash
+
+        spent = np.array(spent)
+        taken = spent > 0
+        closed = taken & (exit_index >= 0)
+        quantity = spent / entry_price
+        pnl = np.where(closed, side * (exit_price - entry_price) * quantity * leverage, np.nan)
+
+        # Equity curve from the book changes: long value is q*p0*(1-lev) + lev*q*p, short q*p0*(1+lev) - lev*q*p
+        cash_delta = np.zeros(len(timeline))
+        constant_delta = np.zeros((len(timeline), len(tickers)))
+        price_delta = np.zeros((len(timeline), len(tickers)))
+        constant = quantity * entry_price * (1 - side * leverage)
+        coefficient = side * leverage * quantity
+        np.add.at(cash_delta, entry_index[taken], -spent[taken])
+        np.add.at(constant_delta, (entry_index[taken], column[taken]), constant[taken])
+        np.add.at(price_delta, (entry_index[taken], column[taken]), coefficient[taken])
+        np.add.at(cash_delta, exit_index[closed], spent[closed] * payback[closed])
+        np.add.at(constant_delta, (exit_index[closed], column[closed]), -constant[closed])
+        np.add.at(price_delta, (exit_index[closed], column[closed]), -coefficient[closed])
+        holdings = (np.cumsum(constant_delta, axis=0) + np.cumsum(price_delta, axis=0) * prices).sum(axis=1)
+        self.equity_curve = pd.Series(self.initial_budget + np.cumsum(cash_delta) + holdings, index=timeline, name='equity')
+
+        open_or_closed = closed[taken]
+        self.transaction_log = pd.DataFrame({
+            'ticker': np.array(tickers, dtype=object)[column[taken].astype(int)],
+            'side': side[taken],
+            'leverage': leverage[taken],
+            'quantity': quantity[taken],
+            'entry_time': timeline[entry_index[taken].astype(int)],
+            'entry_price': entry_price[taken],
+            'exit_time': pd.Series(timeline[np.where(closed, exit_index, 0)[taken].astype(int)]).where(open_or_closed),
+            'exit_price': exit_price[taken],
+            'reason': np.where(~open_or_closed, 'open', np.where(pnl[taken] > 0, 'take_profit', 'stop_loss')),
+            'pnl': pnl[taken],
+        })
+        return self.equity_curve
+
+    def trade_log(self):
+        return self.transaction_log
 
     def evaluate_performance(self):
-        # Method to evaluate the portfolio's performance over time
-        final_value = self.cash + sum(self.portfolio[ticker] * self.fetch_data(ticker)['Close'].iloc[-1] for ticker in self.portfolio)
+        # Open positions are marked at the last close, so no data is downloaded again
+        final_value = self.equity_curve.iloc[-1] if len(self.equity_curve) else self.initial_budget
         return final_value, final_value - self.initial_budget
 
+    def summary(self):
+        final_value, profit = self.evaluate_performance()
+        equity = self.equity_curve
+        drawdown = (equity / equity.cummax() - 1).min() if len(equity) else 0.0
+        closed = self.transaction_log.dropna(subset=['pnl'])
+        returns = equity.pct_change().dropna()
+        return {
+            'final_value': final_value,
+            'profit': profit,
+            'return_pct': profit / self.initial_budget * 100,
+            'max_drawdown_pct': drawdown * 100,
+            'trades': len(self.transaction_log),
+            'closed_trades': len(closed),
+            'win_rate_pct': (closed['pnl'] > 0).mean() * 100 if len(closed) else 0.0,
+            'average_pnl': closed['pnl'].mean() if len(closed) else 0.0,
+            'sharpe_per_bar': returns.mean() / returns.std() if returns.std() > 0 else 0.0,
+        }
+
     def run_backtest(self):
         self.simulate_trades()
         final_value, profit = self.evaluate_performance()
         print(f"Final Portfolio Value: {final_value}, Profit: {profit}")
-        # Optionally, print or analyze transaction_log for detailed insights
-
+        summary = self.summary()
+        for name, value in summary.items():
+            print(f"{name}: {value}")
+        return summary
@@ -0,0 +1,131 @@
+import json
+import os
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from market_data import DAY_NS, YFinanceProvider, period_days
+
+BAR_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('Open', '<f8'),
+    ('High', '<f8'),
+    ('Low', '<f8'),
+    ('Close', '<f8'),
+    ('Volume', '<f8'),
+])
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# How much history to pull the first time a (ticker, interval) series is seen
+INITIAL_PERIODS = {'1m': '5d', '1h': '1mo', '1d': '1y'}
+
+
+class BarStore:
+    def __init__(self, root='bars', refresh_interval=30, market_data=None):
+        self.root = root
+        self.refresh_interval = refresh_interval
+        self.market_data = market_data or YFinanceProvider()
+        self.last_update = {}
+        self.fetches = 0
+
+    def _paths(self, ticker, interval):
+        directory = os.path.join(self.root, ticker)
+        return os.path.join(directory, f'{interval}.bin'), os.path.join(directory, f'{interval}.json')
+
+    def _read_meta(self, ticker, interval):
+        meta_path = self._paths(ticker, interval)[1]
+        if not os.path.exists(meta_path):
+            return {}
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def bars(self, ticker, interval):
+        # Memory-mapped view of every stored bar, no copy until sliced
+        bin_path = self._paths(ticker, interval)[0]
+        if not os.path.exists(bin_path) or os.path.getsize(bin_path) == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.memmap(bin_path, dtype=BAR_DTYPE, mode='r')
+
+    def last_timestamp(self, ticker, interval):
+        bars = self.bars(ticker, interval)
+        return int(bars['ts'][-1]) if len(bars) else None
+
+    def append(self, ticker, interval, frame):
+        bin_path, meta_path = self._paths(ticker, interval)
+        os.makedirs(os.path.dirname(bin_path), exist_ok=True)
+        if frame.empty:
+            return 0
+
+        index = frame.index if frame.index.tz is not None else frame.index.tz_localize('UTC')
+        records = np.empty(len(frame), dtype=BAR_DTYPE)
+        records['ts'] = index.as_unit('ns').asi8
+        for column in COLUMNS:
+            records[column] = frame[column].to_numpy(dtype='f8') if column in frame else np.nan
+
+        last_ts = self.last_timestamp(ticker, interval)
+        if last_ts is not None:
+            # The last stored bar may have been partial, so it is rewritten
+            records = records[records['ts'] >= last_ts]
+            if len(records) and records['ts'][0] == last_ts:
+                os.truncate(bin_path, os.path.getsize(bin_path) - BAR_DTYPE.itemsize)
+        with open(bin_path, 'ab') as f:
+            f.write(records.tobytes())
+        if not os.path.exists(meta_path):
+            with open(meta_path, 'w') as f:
+                json.dump({'tz': str(index.tz)}, f)
+        return len(records)
+
+    def update(self, ticker, interval, period):
+        key = (ticker, interval)
+        now = time.monotonic()
+        if now - self.last_update.get(key, -self.refresh_interval) < self.refresh_interval:
+            return 0
+
+        last_ts = self.last_timestamp(ticker, interval)
+        self.fetches += 1
+        if last_ts is None:
+            period = max(period, INITIAL_PERIODS.get(interval, period), key=period_days)
+            frame = self.market_data.history(ticker, period=period, interval=interval)
+        else:
+            frame = self.market_data.history(ticker, interval=interval, start=pd.Timestamp(last_ts, tz='UTC'))
+        self.last_update[key] = now
+        return self.append(ticker, interval, frame)
+
+    def to_frame(self, records, ticker, interval):
+        tz = self._read_meta(ticker, interval).get('tz', 'UTC')
+        # Straight from the int64 nanoseconds, without going through pd.to_datetime's parsing
+        index = pd.DatetimeIndex(np.ascontiguousarray(records['ts']).view('datetime64[ns]')).tz_localize('UTC').tz_convert(tz)
+        return pd.DataFrame({column: np.asarray(records[column]) for column in COLUMNS}, index=index)
+
+    def range(self, ticker, interval, start=None, end=None):
+        bars = self.bars(ticker, interval)
+        timestamps = bars['ts']
+        lo = 0 if start is None else np.searchsorted(timestamps, pd.Timestamp(start).value, side='left')
+        hi = len(bars) if end is None else np.searchsorted(timestamps, pd.Timestamp(end).value, side='left')
+        return self.to_frame(bars[lo:hi], ticker, interval)
+
+    def day(self, ticker, interval, date):
+        tz = self._read_meta(ticker, interval).get('tz', 'UTC')
+        start = pd.Timestamp(date).tz_localize(tz)
+        return self.range(ticker, interval, start, start + timedelta(days=1))
+
+    def period_bars(self, ticker, period, interval):
+        # The records of history(), sliced like market_data.period_slice without building a frame
+        self.update(ticker, interval, period)
+        bars = self.bars(ticker, interval)
+        if not len(bars):
+            return bars
+        # Only the tail covering the period (plus weekends and holidays) is looked at
+        start = bars['ts'][-1] - (2 * period_days(period) + 4) * DAY_NS
+        bars = bars[np.searchsorted(bars['ts'], start, side='left'):]
+        if period.endswith('d') and not period.endswith('mo'):
+            tz = self._read_meta(ticker, interval).get('tz', 'UTC')
+            local = bars['ts'] if tz == 'UTC' else pd.DatetimeIndex(np.ascontiguousarray(bars['ts']).view('datetime64[ns]')).tz_localize('UTC').tz_convert(tz).tz_localize(None).asi8
+            days = local // DAY_NS
+            return bars[days >= np.unique(days)[-int(period[:-1]):][0]]
+        return bars[bars['ts'] > bars['ts'][-1] - period_days(period) * DAY_NS]
+
+    def history(self, ticker, period, interval):
+        return self.to_frame(self.period_bars(ticker, period, interval), ticker, interval)
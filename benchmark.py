@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from strategist import Strategist
+from strategist_service import StrategistService
+from multi_term import MultiTermScorer
+from indicators.moving_average import MovingAverage
+from indicators.rsi import RSI
+from indicators.macd import MACD
+from indicators.bollinger_bands import BollingerBands
+from indicators.stochastic_oscillator import StochasticOscillator
+from indicators.pivot_points import PivotPoints
+from market_data import ReplayProvider, record
+from bar_store import BarStore
+from price_snapshot import PriceSnapshot, StaticQuotes
+
+BASELINE_PATH = 'benchmark_baseline.json'
+TICKERS = ['BTC-EUR', 'ETH-EUR', 'SOL-EUR', 'DOGE-EUR', 'LTC-EUR']
+
+
+def synthetic_bars(n, seed=0, freq='1min', start='2025-01-06'):
+    # Geometric random walk with a plausible intrabar range, fully determined by the seed
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=n, freq=freq, tz='UTC')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.0008, n)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = rng.random(n) * 0.001
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + spread),
+        'Low': np.minimum(open_, close) * (1 - spread),
+        'Close': close,
+        'Volume': rng.integers(1, 1000, n).astype(float),
+    }, index=index)
+
+
+def measure(run, repeats, budget, min_sample=0.005):
+    # Calls are batched like timeit.autorange until one sample takes `min_sample` seconds, so
+    # sub-millisecond paths are not dominated by timer noise; the warm-up batch is not recorded.
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            run()
+        if time.perf_counter() - t0 >= min_sample or number >= 1024:
+            break
+        number *= 2
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < repeats and (not timings or time.perf_counter() - started < budget):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            run()
+        timings.append((time.perf_counter() - t0) / number)
+    timings = np.array(timings)
+    return {
+        'runs': len(timings) * number,
+        'mean': float(timings.mean()),
+        'min': float(timings.min()),
+        'p50': float(np.percentile(timings, 50)),
+        'p90': float(np.percentile(timings, 90)),
+        'p99': float(np.percentile(timings, 99)),
+        'max': float(timings.max()),
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def indicator_benchmarks(sizes):
+    specs = [
+        (MovingAverage, {'short_window': 5, 'long_window': 20}),
+        (RSI, {'window': 14}),
+        (MACD, {'short_span': 12, 'long_span': 26, 'signal_span': 9}),
+        (BollingerBands, {'window': 20}),
+        (StochasticOscillator, {'window': 14}),
+        (PivotPoints, {}),
+    ]
+    for size in sizes:
+        data = synthetic_bars(size)
+        for IndicatorClass, params in specs:
+            indicator = IndicatorClass(data[['Open', 'High', 'Low', 'Close']].copy(), **params)
+            yield f'indicators.{IndicatorClass.__name__}.calculate[{size}]', indicator.calculate
+            yield f'indicators.{IndicatorClass.__name__}.analyze[{size}]', indicator.analyze
+        del data
+
+
+def replay_feed(workdir, days=3):
+    # Recorded synthetic minute bars for the watchlist, served by a replay clock frozen on the last day
+    replay_dir = os.path.join(workdir, 'replay')
+    if not os.path.isdir(replay_dir):
+        for seed, ticker in enumerate(TICKERS):
+            record(replay_dir, ticker, '1m', synthetic_bars(days * 1440, seed))
+    return replay_dir, ReplayProvider(replay_dir, speed=None, start=pd.Timestamp('2025-01-06', tz='UTC') + pd.Timedelta(days=days - 0.5))
+
+
+def strategist_benchmarks(workdir):
+    _, market_data = replay_feed(workdir)
+    store = BarStore(os.path.join(workdir, 'bars'), refresh_interval=float('inf'), market_data=market_data)
+    strategist = Strategist(TICKERS[0], 'short', bar_store=store)
+
+    def advice():
+        strategist.update_data(strategist.data)  # New data version, so nothing is served from the memo
+        return strategist.advice()
+
+    def report():
+        with working_directory(workdir), quiet():
+            strategist.generate_pdf_report(strategist.advice())
+
+    service = StrategistService(TICKERS[0], 'short', bar_store=store)
+    service.update()
+
+    yield 'strategist.advice', advice
+    yield 'strategist_service.update', service.update
+    yield 'multi_term.scores', lambda: MultiTermScorer.from_store(store, TICKERS).scores()
+    yield 'strategist.generate_pdf_report', report
+
+    # The five-ticker report set, rendered in parallel by the report processes
+    from report_worker import ReportWorker
+    strategists = [Strategist(ticker, 'short', bar_store=store) for ticker in TICKERS]
+    scores = [strategist.advice() for strategist in strategists]
+    with working_directory(workdir):
+        reports = ReportWorker(workers=min(len(TICKERS), os.cpu_count() or 1))
+    yield 'reports.render_all', lambda: reports.render_all(strategists, scores)
+    reports.close(wait=True)
+
+
+def valuation_benchmarks(workdir, counts):
+    from trade_operations import TradeOperations
+    rng = np.random.default_rng(0)
+    quotes = StaticQuotes({ticker: 100.0 for ticker in TICKERS})
+    for count in counts:
+        operations = TradeOperations(os.path.join(workdir, f'valuation_{count}.db'), PriceSnapshot(quotes, ttl=float('inf')))
+        entry = 100 * (1 + rng.normal(0, 0.001, count))
+        rows = [(TICKERS[i % len(TICKERS)], 1.0, float(entry[i]), 50.0, 200.0, 1.0) for i in range(count)]
+        operations.cur.executemany('''INSERT INTO portfolio (ticker, quantity, bought_price, stop_loss, take_profit, leverage)
+                                      VALUES (?, ?, ?, ?, ?, ?)''', rows[::2])
+        operations.cur.executemany('''INSERT INTO short_positions (ticker, quantity, entry_price, stop_loss, take_profit, leverage)
+                                      VALUES (?, ?, ?, ?, ?, ?)''', [(t, q, p, 200.0, 50.0, l) for t, q, p, _, _, l in rows[1::2]])
+        operations.conn.commit()
+        operations.load_book()
+        operations.prices.refresh(TICKERS)
+
+        def valuation(operations=operations):
+            with quiet():
+                operations.calculate_total_value()
+
+        def risk_check(operations=operations):
+            with quiet():
+                operations.check_portfolio_for_take_profit_or_stop_loss()
+
+        yield f'trade_operations.calculate_total_value[{count}]', valuation
+        yield f'trade_operations.risk_check[{count}]', risk_check
+
+
+def cycle_benchmarks(workdir):
+    # A full main.py cycle against a frozen replay feed, in its own directory so no real data is touched
+    replay_dir, market_data = replay_feed(workdir)
+    os.environ['REPLAY_DIR'] = replay_dir
+    with working_directory(workdir), quiet():
+        import main
+    main.market_data.speed = None
+    main.market_data.start = market_data.start
+
+    from report_worker import ReportWorker
+    with working_directory(workdir):
+        reports = ReportWorker(every=1)  # The worker processes keep the directory they were forked in
+    executor = ThreadPoolExecutor(len(TICKERS) + 1)
+    loop = asyncio.new_event_loop()
+    cycle = [0]
+
+    def run_cycle():
+        with working_directory(workdir), quiet():
+            loop.run_until_complete(main.run_cycle(loop, executor, reports, cycle[0]))
+        cycle[0] += 1
+        main.market_data.advance(60)
+
+    yield 'main.run_cycle', run_cycle
+    reports.close(wait=True)  # Running renders finish before the temporary directory goes away
+    executor.shutdown()
+    loop.close()
+
+
+def compare(results, baseline, tolerance, stat='min'):
+    # A benchmark regresses when `stat` is more than `tolerance` slower than in the baseline.
+    # The default is the fastest sample, which other load on the machine disturbs the least.
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            print(f"{name}: {stat} {result[stat] * 1000:.3f} ms (no baseline)")
+            continue
+        ratio = result[stat] / reference[stat] if reference[stat] else float('inf')
+        status = 'REGRESSION' if ratio > 1 + tolerance else 'ok'
+        print(f"{name}: {stat} {result[stat] * 1000:.3f} ms vs {reference[stat] * 1000:.3f} ms ({ratio:.2f}x) {status}")
+        if status == 'REGRESSION':
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks of the indicator, strategist, valuation and trading-cycle hot paths')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 10_000_000], help='indicator input rows')
+    parser.add_argument('--positions', type=int, nargs='+', default=[10, 1_000, 100_000], help='open positions for valuation')
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--budget', type=float, default=5.0, help='seconds of timed runs per benchmark at most')
+    parser.add_argument('--only', help='run only benchmarks whose name contains this text')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--stat', default='min', choices=['min', 'mean', 'p50', 'p90', 'p99'], help='statistic compared against the baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        groups = [
+            indicator_benchmarks(args.sizes),
+            strategist_benchmarks(workdir),
+            valuation_benchmarks(workdir, args.positions),
+            cycle_benchmarks(workdir),
+        ]
+        for group in groups:
+            for name, run in group:
+                if args.only and args.only not in name:
+                    continue
+                results[name] = measure(run, args.repeats, args.budget)
+                print(f"{name}: p50 {results[name]['p50'] * 1000:.3f} ms, p99 {results[name]['p99'] * 1000:.3f} ms ({results[name]['runs']} runs)")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.stat)
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
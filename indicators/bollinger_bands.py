@@ -1,40 +1,58 @@
-import matplotlib.pyplot as plt
+import numpy as np
+
+from indicators.columns import Columns, as_buffer
+from indicators.plotting import line, pyplot
 
 class BollingerBands:
-    def __init__(self, data, window):
+    def __init__(self, data, window, dtype=np.float64):
         self.data = data
         self.window = window
+        self.dtype = dtype
 
     def calculate(self):
-        self.data['20_MA'] = self.data['Close'].rolling(window=self.window).mean()
-        self.data['20_STD'] = self.data['Close'].rolling(window=self.window).std()
-        self.data['Upper Band'] = self.data['20_MA'] + (self.data['20_STD'] * 2)
-        self.data['Lower Band'] = self.data['20_MA'] - (self.data['20_STD'] * 2)
-        return self.data
+        middle = self.data['Close'].rolling(window=self.window).mean().to_numpy()
+        std = self.data['Close'].rolling(window=self.window).std().to_numpy()
+        self.output = Columns(self.data.index, {
+            '20_MA': as_buffer(middle, self.dtype),
+            '20_STD': as_buffer(std, self.dtype),
+            'Upper Band': as_buffer(middle + (std * 2), self.dtype),
+            'Lower Band': as_buffer(middle - (std * 2), self.dtype),
+        })
+        return self.output
 
     def analyze(self):
-        close = self.data['Close'].iloc[-1]
-        upper_band = self.data['Upper Band'].iloc[-1]
-        lower_band = self.data['Lower Band'].iloc[-1]
-        middle_band = self.data['20_MA'].iloc[-1]
-
-        if close > upper_band:
-            score = max(0, 50 - (close - upper_band) / upper_band * 50)  # Cap the score at 0
-        elif close < lower_band:
-            score = min(100, 50 + (lower_band - close) / lower_band * 50)  # Cap the score at 100
-        else:
-            if close > middle_band:
-                score = 50 + (close - middle_band) / (upper_band - middle_band) * 50  # Map Middle Band to Upper Band to 50-100
-            else:
-                score = 50 - (middle_band - close) / (middle_band - lower_band) * 50  # Map Lower Band to Middle Band to 0-50
+        return float(self.score(
+            self.data['Close'].iloc[-1],
+            self.output.last('Upper Band'),
+            self.output.last('Lower Band'),
+            self.output.last('20_MA'),
+        ))
 
-        return score
+    @staticmethod
+    def score(close, upper_band, lower_band, middle_band):
+        close, upper_band, lower_band, middle_band = np.broadcast_arrays(
+            *(np.asarray(value, dtype=float) for value in (close, upper_band, lower_band, middle_band))
+        )
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.select(
+                [close > upper_band, close < lower_band, close > middle_band],
+                [
+                    np.fmax(0, 50 - (close - upper_band) / upper_band * 50),  # Cap the score at 0
+                    np.fmin(100, 50 + (lower_band - close) / lower_band * 50),  # Cap the score at 100
+                    50 + (close - middle_band) / (upper_band - middle_band) * 50,  # Map Middle Band to Upper Band to 50-100
+                ],
+                50 - (middle_band - close) / (middle_band - lower_band) * 50,  # Map Lower Band to Middle Band to 0-50
+            )
 
-    def plot(self):
-        plt.plot(self.data['Close'], label='Close Price')
-        plt.plot(self.data['Upper Band'], label='Upper Band', color='red')
-        plt.plot(self.data['Lower Band'], label='Lower Band', color='green')
-        plt.plot(self.data['20_MA'], label='20-Day MA', color='blue')
-        plt.legend()
-        plt.title('Bollinger Bands')
-        plt.tight_layout()
+    def plot(self, ax=None):
+        # On the given axes, or pyplot's current ones; long series are decimated before drawing
+        standalone = ax is None
+        ax = pyplot().gca() if standalone else ax
+        line(ax, self.data.index, self.data['Close'], label='Close Price')
+        line(ax, self.output.index, self.output.values('Upper Band'), label='Upper Band', color='red')
+        line(ax, self.output.index, self.output.values('Lower Band'), label='Lower Band', color='green')
+        line(ax, self.output.index, self.output.values('20_MA'), label='20-Day MA', color='blue')
+        ax.legend()
+        ax.set_title('Bollinger Bands')
+        if standalone:
+            ax.figure.tight_layout()
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+
+class Columns:
+    # Indicator outputs kept as one compact NumPy buffer per column, sharing the input's index
+    # instead of being added to the input frame. A Series is only built when a column is asked
+    # for (plots, tables) and wraps the buffer without copying it.
+    def __init__(self, index, buffers):
+        self.index = index
+        self.buffers = buffers
+
+    def values(self, column):
+        return self.buffers[column]
+
+    def last(self, column):
+        return float(self.buffers[column][-1])
+
+    def __getitem__(self, column):
+        return pd.Series(self.buffers[column], index=self.index, name=column, copy=False)
+
+    def __contains__(self, column):
+        return column in self.buffers
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def columns(self):
+        return list(self.buffers)
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+    def to_frame(self):
+        return pd.DataFrame(self.buffers, index=self.index)
+
+
+def as_buffer(values, dtype=np.float64):
+    # Series or array as a bare buffer of `dtype`, copied only when the dtype changes
+    return np.asarray(values, dtype=dtype)
@@ -1,35 +1,41 @@
-import matplotlib.pyplot as plt
+import numpy as np
+
+from indicators.columns import Columns, as_buffer
+from indicators.plotting import line, pyplot
 
 class MACD:
-    def __init__(self, data, short_span, long_span, signal_span):
+    def __init__(self, data, short_span, long_span, signal_span, dtype=np.float64):
         self.data = data
         self.short_span = short_span
         self.long_span = long_span
         self.signal_span = signal_span
+        self.dtype = dtype
 
     def calculate(self):
         exp1 = self.data['Close'].ewm(span=self.short_span, adjust=False).mean()
         exp2 = self.data['Close'].ewm(span=self.long_span, adjust=False).mean()
-        self.data['MACD'] = exp1 - exp2
-        self.data['Signal Line'] = self.data['MACD'].ewm(span=self.signal_span, adjust=False).mean()
-        return self.data
+        macd = exp1 - exp2
+        signal = macd.ewm(span=self.signal_span, adjust=False).mean()
+        self.output = Columns(self.data.index, {'MACD': as_buffer(macd, self.dtype), 'Signal Line': as_buffer(signal, self.dtype)})
+        return self.output
 
     def analyze(self):
-        macd = self.data['MACD'].iloc[-1]
-        signal = self.data['Signal Line'].iloc[-1]
-        difference = macd - signal
-        
-        # Determine the score based on the difference
-        if difference > 0:
-            score = min(100, 50 + (difference / signal) * 50)  # Cap the score at 100
-        else:
-            score = max(0, 50 + (difference / signal) * 50)  # Cap the score at 0
+        return float(self.score(self.output.last('MACD'), self.output.last('Signal Line')))
 
-        return score
+    @staticmethod
+    def score(macd, signal):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            difference = np.subtract(macd, signal)
+            raw = 50 + (difference / signal) * 50
+            return np.where(difference > 0, np.fmin(100, raw), np.fmax(0, raw))  # Cap the score at 0-100
 
-    def plot(self):
-        plt.plot(self.data['MACD'], label='MACD', color='blue')
-        plt.plot(self.data['Signal Line'], label='Signal Line', color='red')
-        plt.legend()
-        plt.title('MACD')
-        plt.tight_layout()
+    def plot(self, ax=None):
+        # On the given axes, or pyplot's current ones; long series are decimated before drawing
+        standalone = ax is None
+        ax = pyplot().gca() if standalone else ax
+        line(ax, self.output.index, self.output.values('MACD'), label='MACD', color='blue')
+        line(ax, self.output.index, self.output.values('Signal Line'), label='Signal Line', color='red')
+        ax.legend()
+        ax.set_title('MACD')
+        if standalone:
+            ax.figure.tight_layout()
@@ -1,43 +1,57 @@
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+
+from indicators.columns import Columns, as_buffer
+from indicators.plotting import line, pyplot
 
 class MovingAverage:
-    def __init__(self, data, short_window, long_window):
+    def __init__(self, data, short_window, long_window, dtype=np.float64):
         self.data = data
         self.short_window = short_window
         self.long_window = long_window
+        self.dtype = dtype
 
     def calculate(self):
-        self.data['short_mavg'] = self.data['Close'].rolling(window=self.short_window).mean()
-        self.data['long_mavg'] = self.data['Close'].rolling(window=self.long_window).mean()
-        self.data['positions'] = pd.Series(np.where(self.data['short_mavg'] > self.data['long_mavg'], 1, 0), index=self.data.index).diff().fillna(0)
-        return self.data
+        short_mavg = self.data['Close'].rolling(window=self.short_window).mean().to_numpy()
+        long_mavg = self.data['Close'].rolling(window=self.long_window).mean().to_numpy()
+        # Crossovers as int8: 1 where the short average crosses above, -1 where it crosses below
+        above = (short_mavg > long_mavg).astype(np.int8)
+        self.output = Columns(self.data.index, {
+            'short_mavg': as_buffer(short_mavg, self.dtype),
+            'long_mavg': as_buffer(long_mavg, self.dtype),
+            'positions': np.diff(above, prepend=above[:1]),
+        })
+        return self.output
 
     def analyze(self):
-        short_mavg = self.data['short_mavg'].iloc[-1]
-        long_mavg = self.data['long_mavg'].iloc[-1]
-        difference = short_mavg - long_mavg
-        
-        # Determine the score based on the difference
-        if difference > 0:
-            score = min(100, 50 + (difference / long_mavg) * 50)  # Cap the score at 100
-        else:
-            score = max(0, 50 + (difference / long_mavg) * 50)  # Cap the score at 0
+        return float(self.score(self.output.last('short_mavg'), self.output.last('long_mavg')))
 
-        return score
+    @staticmethod
+    def score(short_mavg, long_mavg):
+        # Works on scalars or arrays; fmin/fmax keep min()/max()'s NaN behaviour
+        with np.errstate(divide='ignore', invalid='ignore'):
+            difference = np.subtract(short_mavg, long_mavg)
+            raw = 50 + (difference / long_mavg) * 50
+            return np.where(difference > 0, np.fmin(100, raw), np.fmax(0, raw))  # Cap the score at 0-100
 
-    def plot(self):
-        plt.plot(self.data['Close'], label='Close Price')
-        plt.plot(self.data['short_mavg'], label=f'{self.short_window}-Day MA')
-        plt.plot(self.data['long_mavg'], label=f'{self.long_window}-Day MA')
-        self.plot_signals()
-        plt.legend()
-        plt.title('Moving Averages')
-        plt.tight_layout()
+    def plot(self, ax=None):
+        # On the given axes, or pyplot's current ones; long series are decimated before drawing
+        standalone = ax is None
+        ax = pyplot().gca() if standalone else ax
+        line(ax, self.data.index, self.data['Close'], label='Close Price')
+        line(ax, self.output.index, self.output.values('short_mavg'), label=f'{self.short_window}-Day MA')
+        line(ax, self.output.index, self.output.values('long_mavg'), label=f'{self.long_window}-Day MA')
+        self.plot_signals(ax)
+        ax.legend()
+        ax.set_title('Moving Averages')
+        if standalone:
+            ax.figure.tight_layout()
 
-    def plot_signals(self):
-        buy_signals = self.data[self.data['positions'] == 1]
-        sell_signals = self.data[self.data['positions'] == -1]
-        plt.plot(buy_signals.index, self.data['Close'][buy_signals.index], '^', markersize=10, color='g', label='Buy Signal')
-        plt.plot(sell_signals.index, self.data['Close'][sell_signals.index], 'v', markersize=10, color='r', label='Sell Signal')
+    def plot_signals(self, ax=None):
+        # Crossovers are sparse, they are drawn in full
+        ax = pyplot().gca() if ax is None else ax
+        positions = self.output.values('positions')
+        close = self.data['Close'].to_numpy()
+        buy_signals = positions == 1
+        sell_signals = positions == -1
+        ax.plot(self.output.index[buy_signals], close[buy_signals], '^', markersize=10, color='g', label='Buy Signal')
+        ax.plot(self.output.index[sell_signals], close[sell_signals], 'v', markersize=10, color='r', label='Sell Signal')
@@ -1,64 +1,89 @@
-import matplotlib.pyplot as plt
+import numpy as np
+
+from indicators.plotting import line, pyplot
+
+
+def linear_interpolate(x, x0, x1, y0, y1):
+    return y0 + (x - x0) * (y1 - y0) / (x1 - x0)
+
+
+class PivotLevels:
+    # The seven levels of a session; they are constants, so they are not spread over columns
+    __slots__ = ('pivot', 'r1', 'r2', 'r3', 's1', 's2', 's3')
+    LABELS = ('Pivot', 'R1', 'R2', 'R3', 'S1', 'S2', 'S3')
+
+    def __init__(self, pivot, r1, r2, r3, s1, s2, s3):
+        self.pivot, self.r1, self.r2, self.r3, self.s1, self.s2, self.s3 = pivot, r1, r2, r3, s1, s2, s3
+
+    def __getitem__(self, label):
+        return getattr(self, label.lower())
+
+    def values(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def __repr__(self):
+        return 'PivotLevels(' + ', '.join(f'{label}={value:.4f}' for label, value in zip(self.LABELS, self.values())) + ')'
+
 
 class PivotPoints:
     def __init__(self, data):
         self.data = data
 
     def calculate(self):
-        max_value = self.data['High'].max()
-        min_value = self.data['Low'].min()
-        close = self.data['Close'].iloc[-1]
-        self.data['Pivot'] = (max_value + min_value + close) / 3
-        self.data['R1'] = 2 * self.data['Pivot'] - min_value
-        self.data['S1'] = 2 * self.data['Pivot'] - max_value
-        self.data['R2'] = self.data['Pivot'] + (max_value - min_value)
-        self.data['S2'] = self.data['Pivot'] - (max_value - min_value)
-        self.data['R3'] = max_value + 2 * (self.data['Pivot'] - min_value)
-        self.data['S3'] = min_value - 2 * (max_value - self.data['Pivot'])
-        return self.data
+        max_value = float(self.data['High'].max())
+        min_value = float(self.data['Low'].min())
+        close = float(self.data['Close'].iloc[-1])
+        pivot = (max_value + min_value + close) / 3
+        self.levels = PivotLevels(
+            pivot,
+            2 * pivot - min_value,
+            pivot + (max_value - min_value),
+            max_value + 2 * (pivot - min_value),
+            2 * pivot - max_value,
+            pivot - (max_value - min_value),
+            min_value - 2 * (max_value - pivot),
+        )
+        return self.levels
 
     def analyze(self):
-        close = self.data['Close'].iloc[-1]
-        pivot = self.data['Pivot'].iloc[-1]
-        s3 = self.data['S3'].iloc[-1]
-        s2 = self.data['S2'].iloc[-1]
-        s1 = self.data['S1'].iloc[-1]
-        r1 = self.data['R1'].iloc[-1]
-        r2 = self.data['R2'].iloc[-1]
-        r3 = self.data['R3'].iloc[-1]
-
-        def linear_interpolate(x, x0, x1, y0, y1):
-            return y0 + (x - x0) * (y1 - y0) / (x1 - x0)
-
-        if close <= s3:
-            score = linear_interpolate(close, s3, s3, 30, 30)  # Close at or below S3, score is 30
-        elif s3 < close <= s2:
-            score = linear_interpolate(close, s3, s2, 30, 50)  # Interpolate between S3 (30) and S2 (50)
-        elif s2 < close <= s1:
-            score = linear_interpolate(close, s2, s1, 50, 70)  # Interpolate between S2 (50) and S1 (70)
-        elif s1 < close <= pivot:
-            score = linear_interpolate(close, s1, pivot, 70, 50)  # Interpolate between S1 (70) and pivot (50)
-        elif pivot < close <= r1:
-            score = linear_interpolate(close, pivot, r1, 50, 70)  # Interpolate between pivot (50) and R1 (70)
-        elif r1 < close <= r2:
-            score = linear_interpolate(close, r1, r2, 70, 90)  # Interpolate between R1 (70) and R2 (90)
-        elif r2 < close <= r3:
-            score = linear_interpolate(close, r2, r3, 90, 100)  # Interpolate between R2 (90) and R3 (100)
-        else:
-            score = linear_interpolate(close, r3, r3, 100, 100)  # Close at or above R3, score is 100
-
-        return score
-
-
-    def plot(self):
-        plt.plot(self.data['Close'], label='Close Price')
-        plt.axhline(y=self.data['Pivot'].iloc[-1], color='black', linestyle='--', label='Pivot')
-        plt.axhline(y=self.data['R1'].iloc[-1], color='red', linestyle='--', label='R1')
-        plt.axhline(y=self.data['S1'].iloc[-1], color='green', linestyle='--', label='S1')
-        plt.axhline(y=self.data['R2'].iloc[-1], color='red', linestyle='--', label='R2')
-        plt.axhline(y=self.data['S2'].iloc[-1], color='green', linestyle='--', label='S2')
-        plt.axhline(y=self.data['R3'].iloc[-1], color='red', linestyle='--', label='R3')
-        plt.axhline(y=self.data['S3'].iloc[-1], color='green', linestyle='--', label='S3')
-        plt.legend()
-        plt.title('Pivot Points')
-        plt.tight_layout()
+        levels = self.levels
+        return float(self.score(self.data['Close'].iloc[-1], levels.pivot, levels.s1, levels.s2, levels.s3, levels.r1, levels.r2, levels.r3))
+
+    @staticmethod
+    def score(close, pivot, s1, s2, s3, r1, r2, r3):
+        close, pivot, s1, s2, s3, r1, r2, r3 = np.broadcast_arrays(
+            *(np.asarray(value, dtype=float) for value in (close, pivot, s1, s2, s3, r1, r2, r3))
+        )
+        # Earlier branches failing makes each "<=" below equivalent to the original chained comparisons
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.select(
+                [close <= s3, close <= s2, close <= s1, close <= pivot, close <= r1, close <= r2, close <= r3],
+                [
+                    linear_interpolate(close, s3, s3, 30, 30),  # Close at or below S3, score is 30
+                    linear_interpolate(close, s3, s2, 30, 50),  # Interpolate between S3 (30) and S2 (50)
+                    linear_interpolate(close, s2, s1, 50, 70),  # Interpolate between S2 (50) and S1 (70)
+                    linear_interpolate(close, s1, pivot, 70, 50),  # Interpolate between S1 (70) and pivot (50)
+                    linear_interpolate(close, pivot, r1, 50, 70),  # Interpolate between pivot (50) and R1 (70)
+                    linear_interpolate(close, r1, r2, 70, 90),  # Interpolate between R1 (70) and R2 (90)
+                    linear_interpolate(close, r2, r3, 90, 100),  # Interpolate between R2 (90) and R3 (100)
+                ],
+                linear_interpolate(close, r3, r3, 100, 100),  # Close at or above R3, score is 100
+            )
+
+
+    def plot(self, ax=None):
+        # On the given axes, or pyplot's current ones; long series are decimated before drawing
+        standalone = ax is None
+        ax = pyplot().gca() if standalone else ax
+        line(ax, self.data.index, self.data['Close'], label='Close Price')
+        ax.axhline(y=self.levels.pivot, color='black', linestyle='--', label='Pivot')
+        ax.axhline(y=self.levels.r1, color='red', linestyle='--', label='R1')
+        ax.axhline(y=self.levels.s1, color='green', linestyle='--', label='S1')
+        ax.axhline(y=self.levels.r2, color='red', linestyle='--', label='R2')
+        ax.axhline(y=self.levels.s2, color='green', linestyle='--', label='S2')
+        ax.axhline(y=self.levels.r3, color='red', linestyle='--', label='R3')
+        ax.axhline(y=self.levels.s3, color='green', linestyle='--', label='S3')
+        ax.legend()
+        ax.set_title('Pivot Points')
+        if standalone:
+            ax.figure.tight_layout()
@@ -0,0 +1,34 @@
+import numpy as np
+
+# A 10 inch chart at 100 dpi is 1000 pixels wide; more points than that only cost drawing time
+MAX_POINTS = 1000
+
+
+def decimate(x, y, max_points=MAX_POINTS):
+    # Min/max decimation: the series is cut into max_points // 2 buckets and each keeps its lowest and
+    # highest point, in time order, so spikes survive where plain subsampling would drop them
+    y = np.asarray(y, dtype=float)
+    if len(y) <= max_points:
+        return x, y
+    buckets = max_points // 2
+    size = -(-len(y) // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:len(y)] = y
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    # NaNs (gaps and padding) never win a bucket unless it has nothing else
+    lowest = np.where(np.isnan(padded), np.inf, padded).argmin(axis=1) + offsets
+    highest = np.where(np.isnan(padded), -np.inf, padded).argmax(axis=1) + offsets
+    keep = np.unique(np.minimum(np.concatenate([lowest, highest]), len(y) - 1))
+    return x[keep], y[keep]
+
+
+def line(ax, x, y, max_points=MAX_POINTS, **kwargs):
+    return ax.plot(*decimate(x, y, max_points), **kwargs)
+
+
+def pyplot():
+    # Only standalone plots use pyplot's current figure; it is imported on that path alone, since
+    # pyplot picks and loads a GUI backend that scoring and the report figures never need
+    import matplotlib.pyplot as plt
+    return plt
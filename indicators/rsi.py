@@ -1,39 +1,51 @@
-import matplotlib.pyplot as plt
+import numpy as np
+
+from indicators.columns import Columns, as_buffer
+from indicators.plotting import line, pyplot
 
 class RSI:
-    def __init__(self, data, window):
+    PANELS = 2  # plot() draws price and RSI on separate axes
+
+    def __init__(self, data, window, dtype=np.float64):
         self.data = data
         self.window = window
+        self.dtype = dtype
 
     def calculate(self):
         delta = self.data['Close'].diff()
         gain = (delta.where(delta > 0, 0)).rolling(self.window).mean()
         loss = (-delta.where(delta < 0, 0)).rolling(self.window).mean()
         rs = gain / loss
-        self.data['RSI'] = 100 - (100 / (1 + rs))
-        return self.data
+        self.output = Columns(self.data.index, {'RSI': as_buffer(100 - (100 / (1 + rs)), self.dtype)})
+        return self.output
 
     def analyze(self):
-        current_rsi = self.data['RSI'].iloc[-1]
-        
-        if current_rsi < 30:
-            score = 70 + ((30 - current_rsi) / 30) * 30  # Map 0-30 RSI to 70-100 score
-        elif current_rsi > 70:
-            score = (100 - current_rsi) / 30 * 30  # Map 70-100 RSI to 0-30 score
-        else:
-            score = 30 + ((current_rsi - 30) / 40) * 40  # Map 30-70 RSI to 30-70 score
-        
-        return score
+        return float(self.score(self.output.last('RSI')))
+
+    @staticmethod
+    def score(rsi):
+        rsi = np.asarray(rsi, dtype=float)
+        return np.select(
+            [rsi < 30, rsi > 70],
+            [
+                70 + ((30 - rsi) / 30) * 30,  # Map 0-30 RSI to 70-100 score
+                (100 - rsi) / 30 * 30,  # Map 70-100 RSI to 0-30 score
+            ],
+            30 + ((rsi - 30) / 40) * 40,  # Map 30-70 RSI to 30-70 score
+        )
 
-    def plot(self):
-        plt.subplot(2, 1, 1)
-        plt.plot(self.data['Close'], label='Close Price')
-        plt.legend()
-        plt.title('Close Price')
-        plt.subplot(2, 1, 2)
-        plt.plot(self.data['RSI'], label='RSI', color='purple')
-        plt.axhline(70, linestyle='--', color='red')
-        plt.axhline(30, linestyle='--', color='green')
-        plt.legend()
-        plt.title('RSI')
-        plt.tight_layout()
+    def plot(self, ax=None):
+        # Two panels, price above RSI: `ax` is a pair of axes, or new subplots of pyplot's current
+        # figure; long series are decimated before drawing
+        standalone = ax is None
+        price_ax, rsi_ax = pyplot().gcf().subplots(2, 1) if standalone else ax
+        line(price_ax, self.data.index, self.data['Close'], label='Close Price')
+        price_ax.legend()
+        price_ax.set_title('Close Price')
+        line(rsi_ax, self.output.index, self.output.values('RSI'), label='RSI', color='purple')
+        rsi_ax.axhline(70, linestyle='--', color='red')
+        rsi_ax.axhline(30, linestyle='--', color='green')
+        rsi_ax.legend()
+        rsi_ax.set_title('RSI')
+        if standalone:
+            rsi_ax.figure.tight_layout()
@@ -1,41 +1,49 @@
-import matplotlib.pyplot as plt
+import numpy as np
+
+from indicators.columns import Columns, as_buffer
+from indicators.plotting import line, pyplot
 
 class StochasticOscillator:
-    def __init__(self, data, window):
+    def __init__(self, data, window, dtype=np.float64):
         self.data = data
         self.window = window
+        self.dtype = dtype
 
     def calculate(self):
         low_min = self.data['Low'].rolling(window=self.window).min()
         high_max = self.data['High'].rolling(window=self.window).max()
-        self.data['%K'] = 100 * (self.data['Close'] - low_min) / (high_max - low_min)
-        self.data['%D'] = self.data['%K'].rolling(window=3).mean()
-        return self.data
+        k = 100 * (self.data['Close'] - low_min) / (high_max - low_min)
+        self.output = Columns(self.data.index, {'%K': as_buffer(k, self.dtype), '%D': as_buffer(k.rolling(window=3).mean(), self.dtype)})
+        return self.output
 
     def analyze(self):
-        current_k = self.data['%K'].iloc[-1]
-        
-        if current_k < 20:
-            # Linear interpolation from 0 to 20 %K to 70 to 100 score
-            score = 70 + (current_k / 20) * 30
-        elif current_k > 80:
-            # Linear interpolation from 80 to 100 %K to 30 to 0 score
-            score = 30 * (100 - current_k) / 20
-        else:
-            # Linear interpolation from 20 to 80 %K to 30 to 70 score
-            score = 30 + (current_k - 20) * 40 / 60
-        
+        return float(self.score(self.output.last('%K')))
+
+    @staticmethod
+    def score(k):
+        k = np.asarray(k, dtype=float)
+        score = np.select(
+            [k < 20, k > 80],
+            [
+                70 + (k / 20) * 30,  # Linear interpolation from 0 to 20 %K to 70 to 100 score
+                30 * (100 - k) / 20,  # Linear interpolation from 80 to 100 %K to 30 to 0 score
+            ],
+            30 + (k - 20) * 40 / 60,  # Linear interpolation from 20 to 80 %K to 30 to 70 score
+        )
+
         # Ensure score is within 0-100
-        score = max(0, min(100, score))
-        
-        return score
-
-
-    def plot(self):
-        plt.plot(self.data['%K'], label='%K', color='blue')
-        plt.plot(self.data['%D'], label='%D', color='red')
-        plt.axhline(80, linestyle='--', color='red')
-        plt.axhline(20, linestyle='--', color='green')
-        plt.legend()
-        plt.title('Stochastic Oscillator')
-        plt.tight_layout()
+        return np.fmax(0, np.fmin(100, score))
+
+
+    def plot(self, ax=None):
+        # On the given axes, or pyplot's current ones; long series are decimated before drawing
+        standalone = ax is None
+        ax = pyplot().gca() if standalone else ax
+        line(ax, self.output.index, self.output.values('%K'), label='%K', color='blue')
+        line(ax, self.output.index, self.output.values('%D'), label='%D', color='red')
+        ax.axhline(80, linestyle='--', color='red')
+        ax.axhline(20, linestyle='--', color='green')
+        ax.legend()
+        ax.set_title('Stochastic Oscillator')
+        if standalone:
+            ax.figure.tight_layout()
@@ -0,0 +1,299 @@
+import math
+from collections import deque
+
+from indicators.moving_average import MovingAverage
+from indicators.rsi import RSI
+from indicators.macd import MACD
+from indicators.bollinger_bands import BollingerBands
+from indicators.stochastic_oscillator import StochasticOscillator
+
+# The rolling/EWM primitives below follow the update order of pandas' own
+# window kernels (Kahan-compensated sums, Welford variance, adjust=False EWM)
+# so that feeding bars one by one reproduces calculate() to the last bit.
+# The one known exception is the rolling std right after a run of identical
+# closes, where pandas' internal clean-up can differ by ~1e-12.
+
+
+class RollingMean:
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.sum = 0.0
+        self.neg_ct = 0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.consecutive = 0
+        self.prev_value = None
+
+    def update(self, value):
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            if old == old:
+                self.nobs -= 1
+                y = -old - self.compensation_remove
+                t = self.sum + y
+                self.compensation_remove = t - self.sum - y
+                self.sum = t
+                if math.copysign(1.0, old) < 0:
+                    self.neg_ct -= 1
+
+        self.values.append(value)
+        if self.prev_value is None:
+            self.prev_value = value
+        if value == value:
+            self.nobs += 1
+            y = value - self.compensation_add
+            t = self.sum + y
+            self.compensation_add = t - self.sum - y
+            self.sum = t
+            if math.copysign(1.0, value) < 0:
+                self.neg_ct += 1
+            self.consecutive = self.consecutive + 1 if value == self.prev_value else 1
+            self.prev_value = value
+        return self.value()
+
+    def value(self):
+        if self.nobs < self.window:
+            return math.nan
+        if self.consecutive >= self.nobs:
+            return self.prev_value
+        result = self.sum / self.nobs
+        if self.neg_ct == 0 and result < 0:
+            return 0.0
+        if self.neg_ct == self.nobs and result > 0:
+            return 0.0
+        return result
+
+
+class RollingVariance:
+    # Welford's online variance with a sliding window, ddof=1 like Series.rolling().std()
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.mean = 0.0
+        self.ssqdm = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+
+    def update(self, value):
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            if old == old:
+                self.nobs -= 1
+                if self.nobs:
+                    prev_mean = self.mean - self.compensation_remove
+                    y = old - self.compensation_remove
+                    t = y - self.mean
+                    self.compensation_remove = t + self.mean - y
+                    self.mean = self.mean - t / self.nobs
+                    self.ssqdm = self.ssqdm - (old - prev_mean) * (old - self.mean)
+                else:
+                    self.mean = 0.0
+                    self.ssqdm = 0.0
+
+        self.values.append(value)
+        if value == value:
+            self.nobs += 1
+            prev_mean = self.mean - self.compensation_add
+            y = value - self.compensation_add
+            t = y - self.mean
+            self.compensation_add = t + self.mean - y
+            self.mean = self.mean + t / self.nobs
+            self.ssqdm = self.ssqdm + (value - prev_mean) * (value - self.mean)
+        return self.value()
+
+    def value(self):
+        if self.nobs < self.window or self.nobs <= 1:
+            return math.nan
+        return self.ssqdm / (self.nobs - 1)
+
+    def std(self):
+        variance = self.value()
+        return math.sqrt(variance) if variance > 0 else (0.0 if variance == variance else math.nan)
+
+
+class RollingExtreme:
+    # Monotonic deque of (position, value): O(1) amortised rolling min or max
+    def __init__(self, window, mode='min'):
+        self.window = window
+        self.better = (lambda a, b: a <= b) if mode == 'min' else (lambda a, b: a >= b)
+        self.candidates = deque()
+        self.nan_positions = deque()
+        self.count = 0
+
+    def update(self, value):
+        position = self.count
+        self.count += 1
+        while self.candidates and self.candidates[0][0] <= position - self.window:
+            self.candidates.popleft()
+        while self.nan_positions and self.nan_positions[0] <= position - self.window:
+            self.nan_positions.popleft()
+
+        if value != value:
+            self.nan_positions.append(position)
+        else:
+            while self.candidates and self.better(value, self.candidates[-1][1]):
+                self.candidates.pop()
+            self.candidates.append((position, value))
+        return self.value()
+
+    def value(self):
+        if self.count < self.window or self.nan_positions or not self.candidates:
+            return math.nan
+        return self.candidates[0][1]
+
+
+class Ewm:
+    # Series.ewm(span=span, adjust=False).mean(), one observation at a time
+    def __init__(self, span):
+        com = (span - 1) / 2.0
+        self.alpha = 1.0 / (1.0 + com)
+        self.old_wt_factor = 1.0 - self.alpha
+        self.old_wt = 1.0
+        self.weighted = None
+
+    def update(self, value):
+        if self.weighted is None:
+            self.weighted = value
+        elif self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if value == value:
+                if self.weighted != value:
+                    self.weighted = (self.old_wt * self.weighted + self.alpha * value) / (self.old_wt + self.alpha)
+                self.old_wt = 1.0
+        elif value == value:
+            self.weighted = value
+        return self.weighted
+
+    def value(self):
+        return math.nan if self.weighted is None else self.weighted
+
+
+def divide(numerator, denominator):
+    # Float division with numpy semantics (inf/nan instead of ZeroDivisionError)
+    try:
+        return numerator / denominator
+    except ZeroDivisionError:
+        if numerator != numerator or numerator == 0:
+            return math.nan
+        return math.copysign(math.inf, numerator) * math.copysign(1.0, denominator)
+
+
+class StreamingIndicator:
+    def warm_up(self, data):
+        for bar in data[['Close', 'High', 'Low']].to_dict('records'):
+            self.update(bar)
+        return self.values
+
+    def __getitem__(self, column):
+        return self.values[column]
+
+
+class StreamingMovingAverage(StreamingIndicator):
+    def __init__(self, short_window, long_window):
+        self.short_window = short_window
+        self.long_window = long_window
+        self.short_mavg = RollingMean(short_window)
+        self.long_mavg = RollingMean(long_window)
+        self.previous_flag = None
+        self.values = {}
+
+    def update(self, bar):
+        short_mavg = self.short_mavg.update(bar['Close'])
+        long_mavg = self.long_mavg.update(bar['Close'])
+        flag = 1 if short_mavg > long_mavg else 0
+        positions = 0.0 if self.previous_flag is None else float(flag - self.previous_flag)
+        self.previous_flag = flag
+        self.values = {'short_mavg': short_mavg, 'long_mavg': long_mavg, 'positions': positions}
+        return self.values
+
+    def analyze(self):
+        return float(MovingAverage.score(self.values['short_mavg'], self.values['long_mavg']))
+
+
+class StreamingRSI(StreamingIndicator):
+    def __init__(self, window):
+        self.window = window
+        self.gain = RollingMean(window)
+        self.loss = RollingMean(window)
+        self.previous_close = None
+        self.values = {}
+
+    def update(self, bar):
+        close = bar['Close']
+        delta = math.nan if self.previous_close is None else close - self.previous_close
+        self.previous_close = close
+        gain = self.gain.update(delta if delta > 0 else 0.0)
+        loss = self.loss.update(-(delta if delta < 0 else 0.0))
+        rs = divide(gain, loss)
+        self.values = {'RSI': 100 - divide(100, 1 + rs)}
+        return self.values
+
+    def analyze(self):
+        return float(RSI.score(self.values['RSI']))
+
+
+class StreamingMACD(StreamingIndicator):
+    def __init__(self, short_span, long_span, signal_span):
+        self.short_span = short_span
+        self.long_span = long_span
+        self.signal_span = signal_span
+        self.exp1 = Ewm(short_span)
+        self.exp2 = Ewm(long_span)
+        self.signal = Ewm(signal_span)
+        self.values = {}
+
+    def update(self, bar):
+        macd = self.exp1.update(bar['Close']) - self.exp2.update(bar['Close'])
+        self.values = {'MACD': macd, 'Signal Line': self.signal.update(macd)}
+        return self.values
+
+    def analyze(self):
+        return float(MACD.score(self.values['MACD'], self.values['Signal Line']))
+
+
+class StreamingBollingerBands(StreamingIndicator):
+    def __init__(self, window):
+        self.window = window
+        self.mean = RollingMean(window)
+        self.variance = RollingVariance(window)
+        self.values = {}
+
+    def update(self, bar):
+        middle = self.mean.update(bar['Close'])
+        self.variance.update(bar['Close'])
+        std = self.variance.std()
+        self.values = {
+            'Close': bar['Close'],
+            '20_MA': middle,
+            '20_STD': std,
+            'Upper Band': middle + (std * 2),
+            'Lower Band': middle - (std * 2),
+        }
+        return self.values
+
+    def analyze(self):
+        return float(BollingerBands.score(
+            self.values['Close'], self.values['Upper Band'], self.values['Lower Band'], self.values['20_MA']
+        ))
+
+
+class StreamingStochasticOscillator(StreamingIndicator):
+    def __init__(self, window):
+        self.window = window
+        self.low_min = RollingExtreme(window, 'min')
+        self.high_max = RollingExtreme(window, 'max')
+        self.d = RollingMean(3)
+        self.values = {}
+
+    def update(self, bar):
+        low_min = self.low_min.update(bar['Low'])
+        high_max = self.high_max.update(bar['High'])
+        k = divide(100 * (bar['Close'] - low_min), high_max - low_min)
+        self.values = {'%K': k, '%D': self.d.update(k)}
+        return self.values
+
+    def analyze(self):
+        return float(StochasticOscillator.score(self.values['%K']))
@@ -1,19 +1,40 @@
-import time
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from termcolor import colored
 from trade_operations import TradeOperations
-from strategist import Strategist
-from prettytable import PrettyTable
+from order_queue import OrderQueue
+from strategist_service import StrategistService
+from signals import signal_for, STOP_LOSS, TAKE_PROFIT
+from bar_store import BarStore
+from report_worker import ReportWorker
+from market_data import YFinanceProvider, ReplayProvider
+from price_snapshot import PriceSnapshot
+from watchlist import companies
+import metrics
 
-# Replace 'your_db_path.db' with the actual path to your SQLite database file
-operations = TradeOperations('./your_db_path.db')
+# Set REPLAY_DIR to trade against recorded bars (see market_data.record) instead of yfinance,
+# REPLAY_SPEED times faster than real time; replays keep their own database and bar store.
+REPLAY_DIR = os.environ.get('REPLAY_DIR')
+REPLAY_SPEED = float(os.environ.get('REPLAY_SPEED', 1000))
+REPLAY_START = os.environ.get('REPLAY_START')
+time_scale = REPLAY_SPEED if REPLAY_DIR else 1
+
+CYCLE_SECONDS = 60 / time_scale
+REPORT_EVERY = 1  # Render the PDF reports every N cycles
+# Report processes rendering tickers in parallel; one core is left to the trading loop by default
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', max(1, (os.cpu_count() or 1) - 1)))
 
-companies = [
-    {'ticker': 'BTC-EUR', 'color': 'yellow'},
-    {'ticker': 'ETH-EUR', 'color': 'light_magenta'},
-    {'ticker': 'SOL-EUR', 'color': 'light_cyan'},
-    {'ticker': 'DOGE-EUR', 'color': 'dark_grey'},
-    {'ticker': 'LTC-EUR', 'color': 'white'}
-]
+# Per-stage latency histograms, off unless exported: METRICS_FILE is rewritten after every cycle
+# in the Prometheus text format, METRICS_PORT serves the same text over HTTP
+METRICS_FILE = os.environ.get('METRICS_FILE')
+METRICS_PORT = os.environ.get('METRICS_PORT')
+
+market_data = ReplayProvider(REPLAY_DIR, speed=REPLAY_SPEED, start=REPLAY_START) if REPLAY_DIR else YFinanceProvider()
+# Replace 'your_db_path.db' with the actual path to your SQLite database file
+operations = TradeOperations('./replay.db' if REPLAY_DIR else './your_db_path.db', PriceSnapshot(market_data, ttl=30 / time_scale))
+orders = OrderQueue(operations)
+bar_store = BarStore('./replay_bars' if REPLAY_DIR else './bars', refresh_interval=30 / time_scale, market_data=market_data)
 
 def print_header():
     print("="*60)
@@ -25,59 +46,99 @@ def print_footer():
     print(colored("End of Cycle", 'blue', attrs=['bold']))
     print("="*60)
 
-while True:
+# One long-lived strategist per ticker; each cycle only ingests the bars that arrived since the last
+services = {company['ticker']: StrategistService(company['ticker'], 'short', bar_store=bar_store) for company in companies}
+
+async def run_cycle(loop, executor, reports, cycle=0):
     print_header()
-    operations.calculate_total_value()
-    # Check current portfolio and take necessary actions
-    operations.check_portfolio_for_take_profit_or_stop_loss()
+    # Quotes and every ticker's bars are fetched concurrently on the pool;
+    # all SQLite reads and writes stay on this thread, one after the other.
+    tickers = [company['ticker'] for company in companies]
+    quotes = loop.run_in_executor(executor, operations.prices.refresh, tickers + operations.held_tickers())
+    updated = await asyncio.gather(quotes, *(loop.run_in_executor(executor, services[ticker].update) for ticker in tickers))
+    scores = dict(zip(tickers, updated[1:]))
+
+    # Every DB write of the cycle is committed once, at the end of this block
+    with operations.transaction():
+        operations.calculate_total_value()
+        # Check current portfolio and take necessary actions
+        operations.check_portfolio_for_take_profit_or_stop_loss()
 
-    for company in companies:
-        ticker = company['ticker']
-        print(f"========= " + colored(ticker, company['color'], attrs=['bold']) + " =========")
+        for company in companies:
+            ticker = company['ticker']
+            print(f"========= " + colored(ticker, company['color'], attrs=['bold']) + " =========")
         
-        strategist = Strategist(ticker, 'short')
-        score = strategist.advice()
-        strategist.generate_pdf_report(score)  # Pass the score to the PDF generation method
-
-        price_one_unit = operations.get_current_price_one_unit(ticker)
-        budget = operations.get_budget()
-        stop_loss = 0.002  # 0.2% stop loss
-        take_profit = 0.005  # 0.5% take profit
-
-        if score > 90:
-            leverage = 3
-            quantity = budget * 0.08 / price_one_unit  # Larger position for very strong signals
-            print(colored(f"Very Strong Buy for {ticker}", 'green', attrs=['bold']))
-            operations.buy(ticker, quantity, price_one_unit * (1 - stop_loss), price_one_unit * (1 + take_profit), leverage)
-        elif score > 80:
-            leverage = 2
-            quantity = budget * 0.05 / price_one_unit
-            print(colored(f"Strong Buy for {ticker}", 'green', attrs=['bold']))
-            operations.buy(ticker, quantity, price_one_unit * (1 - stop_loss), price_one_unit * (1 + take_profit), leverage)
-        elif score > 60:
-            leverage = 1
-            quantity = budget * 0.02 / price_one_unit
-            print(colored(f"Buy for {ticker}", 'green'))
-            operations.buy(ticker, quantity, price_one_unit * (1 - stop_loss), price_one_unit * (1 + take_profit), leverage)
-        elif score < 10:
-            leverage = 3
-            quantity = budget * 0.08 / price_one_unit  # Larger position for very strong signals
-            print(colored(f"Very Strong Sell for {ticker}", 'red', attrs=['bold']))
-            operations.sell_short(ticker, quantity, leverage, stop_loss, take_profit)
-        elif score < 20:
-            leverage = 2
-            quantity = budget * 0.05 / price_one_unit
-            print(colored(f"Strong Sell for {ticker}", 'red', attrs=['bold']))
-            operations.sell_short(ticker, quantity, leverage, stop_loss, take_profit)
-        elif score < 40:
-            leverage = 1
-            quantity = budget * 0.02 / price_one_unit
-            print(colored(f"Sell for {ticker}", 'red'))
-            operations.sell_short(ticker, quantity, leverage, stop_loss, take_profit)
-        else:
-            print(colored(f"Hold for {ticker}", 'yellow'))
-
-    operations.calculate_total_value()
-    operations.print_portfolio()
+            score = scores[ticker]
+            with metrics.stage('report.submit'):
+                reports.submit(services[ticker], score, cycle)  # Rendered in the background, off the trading path
+
+            signal = signal_for(score)
+
+            if signal is None:
+                print(colored(f"Hold for {ticker}", 'yellow'))
+                continue
+
+            side, leverage, fraction, label = signal
+            print(colored(f"{label} for {ticker}", 'green' if side > 0 else 'red', attrs=['bold'] if leverage > 1 else []))
+            # One order per ticker and minute of the market clock, so a re-run minute never trades twice
+            client_id = f"{ticker}-{market_data.now():%Y%m%d%H%M}"
+            # Larger position for stronger signals, sized against the budget when the queue fills it
+            orders.submit(client_id, ticker, 'buy' if side > 0 else 'sell_short', fraction=fraction,
+                          leverage=leverage, stop_loss=STOP_LOSS, take_profit=TAKE_PROFIT)
+
+        orders.execute()
+        operations.calculate_total_value()
+        operations.record_cycle(market_data.now(), scores)  # Equity and score history, see timeseries_store
+        operations.print_portfolio()
+    print(f"P&L: {operations.ledger.summary()}")
+    print(f"Price cache: {operations.prices.stats()}")
+    print(f"Orders: {orders.stats()}")
+    print(f"Reports: {reports.stats()}")
     print_footer()
-    time.sleep(60)
+
+def print_stages(summary, limit=5):
+    # Slowest stages of the cycle by total time
+    stages = {stage: values for stage, values in summary.items() if stage != 'cycle'}
+    slowest = sorted(stages.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+    print("Slowest stages: " + ", ".join(f"{stage} {total:.3f}s/{count}" for stage, (count, total, _) in slowest))
+
+async def main():
+    if METRICS_FILE or METRICS_PORT:
+        metrics.enable()
+    if METRICS_PORT:
+        metrics.serve(int(METRICS_PORT))
+    loop = asyncio.get_running_loop()
+    # The report processes are forked before the fetch threads exist
+    reports = ReportWorker(every=REPORT_EVERY, workers=min(REPORT_WORKERS, len(companies)))  # A ticker renders one report at a time
+    try:
+        with ThreadPoolExecutor(max_workers=len(companies) + 1) as executor:
+            await run_loop(loop, executor, reports)
+    finally:
+        reports.close()
+
+async def run_loop(loop, executor, reports):
+    # Cycles start on a fixed cadence measured from the first one, not CYCLE_SECONDS after the previous ended
+    next_start = loop.time()
+    cycle = 0
+    while True:
+        started = loop.time()
+        await run_cycle(loop, executor, reports, cycle)
+        cycle += 1
+        elapsed = loop.time() - started
+        print(f"Cycle took {elapsed:.3f}s")
+        if metrics.registry.enabled:
+            metrics.observe('cycle', elapsed)
+            print_stages(metrics.end_cycle())
+            if METRICS_FILE:
+                metrics.write(METRICS_FILE)
+
+        next_start += CYCLE_SECONDS
+        if loop.time() > next_start:
+            # Overrun: the slots that already passed are dropped instead of run back to back
+            missed = int((loop.time() - next_start) // CYCLE_SECONDS) + 1
+            print(colored(f"Cycle overran its {CYCLE_SECONDS}s slot ({elapsed:.1f}s), skipping {missed} cycle(s)", 'red', attrs=['bold']))
+            next_start += missed * CYCLE_SECONDS
+        await asyncio.sleep(next_start - loop.time())
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+import glob
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+DAY_NS = 86_400 * 10**9
+
+
+def period_days(period):
+    if period.endswith('mo'):
+        return int(period[:-2]) * 30
+    if period.endswith('y'):
+        return int(period[:-1]) * 365
+    if period.endswith('d'):
+        return int(period[:-1])
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def period_slice(frame, period):
+    # Mirror yfinance: 'Nd' means the last N sessions, longer periods are calendar spans
+    if frame.empty:
+        return frame
+    if period.endswith('d') and not period.endswith('mo'):
+        # Local calendar days as integers, much cheaper than comparing datetime.date objects
+        local = frame.index.tz_localize(None) if frame.index.tz is not None else frame.index
+        days = local.as_unit('ns').asi8 // DAY_NS
+        return frame[days >= np.unique(days)[-int(period[:-1]):][0]]
+    return frame[frame.index > frame.index[-1] - timedelta(days=period_days(period))]
+
+
+def interval_delta(interval):
+    # yfinance interval strings ('1m', '5m', '1h', '1d', '1wk') as a Timedelta
+    if interval.endswith('wk'):
+        return pd.Timedelta(weeks=int(interval[:-2]))
+    if interval.endswith('m'):
+        return pd.Timedelta(minutes=int(interval[:-1]))
+    return pd.Timedelta(interval)
+
+
+def as_utc(value):
+    value = pd.Timestamp(value)
+    return value.tz_localize('UTC') if value.tz is None else value.tz_convert('UTC')
+
+
+class YFinanceProvider:
+    # yfinance is imported on the first request rather than with this module: replays, backtests
+    # and commands that never fetch (or fetch later) start without it
+    def history(self, ticker, period=None, interval='1d', start=None, end=None):
+        # Only the arguments that were given are forwarded, yfinance picks its own defaults otherwise
+        kwargs = {name: value for name, value in (('period', period), ('start', start), ('end', end)) if value is not None}
+        import yfinance as yf
+        return yf.Ticker(ticker).history(interval=interval, **kwargs)
+
+    def latest_prices(self, tickers):
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        import yfinance as yf
+        data = yf.download(tickers, period='1d', interval='1m', group_by='ticker', progress=False)
+        prices = {}
+        for ticker in tickers:
+            frame = data[ticker] if isinstance(data.columns, pd.MultiIndex) else data
+            closes = frame['Close'].dropna()
+            if not closes.empty:
+                prices[ticker] = closes.iloc[-1]
+        return prices
+
+    def now(self):
+        # Aware UTC like ReplayProvider's clock, so live and replayed timestamps mean the same instant
+        return datetime.now(timezone.utc)
+
+
+def record(root, ticker, interval, frame, fmt='csv'):
+    # Saves bars in the layout ReplayProvider reads: <root>/<ticker>/<interval>.<fmt>
+    directory = os.path.join(root, ticker)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{interval}.{fmt}')
+    frame = frame[[column for column in COLUMNS if column in frame]]
+    if fmt == 'parquet':
+        frame.to_parquet(path)
+    else:
+        frame.to_csv(path)
+    return path
+
+
+class ReplayProvider:
+    # Serves recorded bars as if they were arriving live. The replay clock starts at `start`
+    # (default: one day after the first recorded bar, so there is a previous session for the
+    # pivots) and runs `speed` times faster than the wall clock;
+    # with speed=None it only moves through advance(), which makes runs fully deterministic.
+    def __init__(self, root, speed=1000, start=None):
+        self.root = root
+        self.speed = speed
+        self.frames = {}
+        for path in sorted(glob.glob(os.path.join(root, '*', '*.csv')) + glob.glob(os.path.join(root, '*', '*.parquet'))):
+            ticker = os.path.basename(os.path.dirname(path))
+            interval, fmt = os.path.splitext(os.path.basename(path))
+            if fmt == '.parquet':
+                frame = pd.read_parquet(path)
+            else:
+                frame = pd.read_csv(path, index_col=0)
+                frame.index = pd.to_datetime(frame.index, utc=True)
+            if frame.index.tz is None:
+                frame.index = frame.index.tz_localize('UTC')
+            # Nanosecond index, so the wall-clock driven replay time can be searched in it
+            frame.index = frame.index.as_unit('ns')
+            self.frames[(ticker, interval)] = frame.sort_index()
+        if not self.frames:
+            raise FileNotFoundError(f"No recorded bars under {root}")
+
+        first = min(frame.index[0] for frame in self.frames.values() if len(frame))
+        self.start = as_utc(first + pd.Timedelta(days=1) if start is None else start)
+        self.offset = pd.Timedelta(0)
+        self.wall_start = time.monotonic()
+
+    def now(self):
+        elapsed = pd.Timedelta(seconds=(time.monotonic() - self.wall_start) * self.speed) if self.speed else pd.Timedelta(0)
+        return self.start + self.offset + elapsed
+
+    def advance(self, seconds):
+        self.offset += pd.Timedelta(seconds=seconds)
+
+    def available(self, ticker, interval):
+        # Bars that have completed by the replay clock, nothing from the future
+        frame = self.frames.get((ticker, interval))
+        if frame is None:
+            return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], tz='UTC'))
+        return frame.iloc[:frame.index.searchsorted(self.now() - interval_delta(interval), side='right')]
+
+    def history(self, ticker, period=None, interval='1d', start=None, end=None):
+        frame = self.available(ticker, interval)
+        if start is not None:
+            frame = frame[frame.index >= as_utc(start)]
+        if end is not None:
+            frame = frame[frame.index < as_utc(end)]
+        if start is None and end is None:
+            frame = period_slice(frame, period or '1mo')
+        return frame.copy()
+
+    def latest_prices(self, tickers):
+        prices = {}
+        for ticker in tickers:
+            # Finest recorded interval wins
+            intervals = sorted((interval for t, interval in self.frames if t == ticker), key=interval_delta)
+            for interval in intervals:
+                closes = self.available(ticker, interval)['Close'].dropna()
+                if not closes.empty:
+                    prices[ticker] = closes.iloc[-1]
+                    break
+        return prices
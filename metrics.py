@@ -0,0 +1,149 @@
+import bisect
+import contextlib
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from a cached price lookup up to a slow report render
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+NULL_STAGE = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def exposition(self, metric, stage):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{stage="{stage}"}} {self.sum}')
+        lines.append(f'{metric}_count{{stage="{stage}"}} {self.count}')
+        return lines
+
+
+class Registry:
+    # Stage latencies of the trading loop. `total` accumulates over the whole run, `cycle` collects
+    # the running cycle and becomes `last_cycle` on end_cycle(). While disabled, stage() hands out
+    # a shared no-op context and timed() costs one attribute check per call.
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.total = {}
+        self.cycle = {}
+        self.last_cycle = {}
+        self.cycles = 0
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            for histograms in (self.total, self.cycle):
+                histogram = histograms.get(stage)
+                if histogram is None:
+                    histogram = histograms[stage] = Histogram()
+                histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def _stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def stage(self, name):
+        return self._stage(name) if self.enabled else NULL_STAGE
+
+    def timed(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def end_cycle(self):
+        # Closes the running cycle; returns its {stage: (count, sum, max)} summary
+        with self.lock:
+            self.last_cycle, self.cycle = self.cycle, {}
+            self.cycles += 1
+            return {stage: (h.count, h.sum, h.max) for stage, h in self.last_cycle.items()}
+
+    def exposition(self):
+        # Prometheus text format
+        with self.lock:
+            lines = [
+                '# HELP trading_stage_seconds Time spent per trading loop stage since start.',
+                '# TYPE trading_stage_seconds histogram',
+            ]
+            for stage in sorted(self.total):
+                lines += self.total[stage].exposition('trading_stage_seconds', stage)
+            lines += [
+                '# HELP trading_last_cycle_stage_seconds Time spent per stage in the last completed cycle.',
+                '# TYPE trading_last_cycle_stage_seconds histogram',
+            ]
+            for stage in sorted(self.last_cycle):
+                lines += self.last_cycle[stage].exposition('trading_last_cycle_stage_seconds', stage)
+            lines += [
+                '# HELP trading_cycles_total Completed trading cycles.',
+                '# TYPE trading_cycles_total counter',
+                f'trading_cycles_total {self.cycles}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        # Replaced atomically, so a scraper (e.g. node_exporter's textfile collector) never reads half a file
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.exposition())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.exposition().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# Process-wide registry, used through the functions below
+registry = Registry()
+enable = registry.enable
+observe = registry.observe
+stage = registry.stage
+timed = registry.timed
+end_cycle = registry.end_cycle
+exposition = registry.exposition
+write = registry.write
+serve = registry.serve
@@ -0,0 +1,140 @@
+import argparse
+import os
+from datetime import timedelta
+
+import pandas as pd
+
+from market_data import period_days, period_slice
+from panel import Panel
+from strategist import Strategist
+
+# The term matrix of the watchlist (or of the tickers given) from the local bar store:
+#
+#     python multi_term.py
+#     python multi_term.py BTC-EUR ETH-EUR --terms short medium
+#     REPLAY_DIR=recorded python multi_term.py --start '2025-03-04 12:00'
+#
+# It updates the bar store it reads, so it must not share one with a running main.py (see --bars).
+
+# Resample rule of each interval the terms use, and the finer view it is built from; the
+# aggregations compose, so daily bars from hourly ones equal daily bars from minute ones
+RULES = {'1m': None, '1h': '1h', '1d': '1D'}
+SOURCES = {'1h': '1m', '1d': '1h'}
+AGGREGATION = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+
+
+def resample(bars, interval):
+    # Coarser bars, labelled by their start like yfinance's; the last one may be partial
+    rule = RULES[interval]
+    if rule is None:
+        return bars
+    aggregation = {column: how for column, how in AGGREGATION.items() if column in bars}
+    return bars.resample(rule, label='left', closed='left').agg(aggregation).dropna(subset=['Close'])
+
+
+def day_slice(frame, date):
+    # Bars of one calendar day in the frame's own timezone, by binary search on the sorted index
+    start = pd.Timestamp(date)
+    start = start.tz_localize(frame.index.tz) if frame.index.tz is not None else start
+    lo, hi = frame.index.searchsorted([start, start + timedelta(days=1)])
+    return frame.iloc[lo:hi]
+
+
+class MultiTermScorer:
+    # Every Strategist term for a set of tickers from one minute-bar series each. The 1h and 1d
+    # views are resampled once from that base; terms on the same view (very_short and short) share
+    # one Panel, and with it the rolling means, EWMs and indicator scores their windows have in
+    # common. Pivot points depend only on the previous session, so they are scored once for all.
+    #
+    # The long term needs a year of minute bars in the base for its 200-day average; with less
+    # history it scores like a Strategist given too few daily bars.
+    def __init__(self, bases, today=None, terms=None):
+        self.bases = bases
+        self.terms = list(terms or Strategist.TERMS)
+        if today is None:
+            today = max(base.index[-1] for base in bases.values() if len(base)).date()
+        self.today = today
+        self.views = {}
+        self.panels = {}
+        self.yesterday = {ticker: day_slice(base, today - timedelta(days=1)) for ticker, base in bases.items()}
+
+    @classmethod
+    def from_store(cls, bar_store, tickers, terms=None, days=None):
+        # Minute bars straight from the local store; `days` defaults to the longest period of the terms
+        terms = list(terms or Strategist.TERMS)
+        today = bar_store.market_data.now().date()
+        if days is None:
+            days = max(period_days(Strategist.TERMS[term][0]) for term in terms) + 1
+        start = pd.Timestamp(today - timedelta(days=days), tz='UTC')
+        bases = {}
+        for ticker in tickers:
+            bar_store.update(ticker, '1m', '5d')
+            bases[ticker] = bar_store.range(ticker, '1m', start=start)
+        return cls(bases, today, terms)
+
+    def view(self, interval):
+        if interval == '1m':
+            return self.bases
+        if interval not in self.views:
+            source = self.view(SOURCES[interval])
+            self.views[interval] = {ticker: resample(bars, interval) for ticker, bars in source.items()}
+        return self.views[interval]
+
+    def panel(self, period, interval):
+        key = (period, interval)
+        if key not in self.panels:
+            frames = {ticker: period_slice(frame, period) for ticker, frame in self.view(interval).items()}
+            self.panels[key] = Panel.from_frames(frames, self.yesterday)
+        return self.panels[key]
+
+    def scores(self):
+        # {ticker: {term: score}}
+        matrix = {ticker: {} for ticker in self.bases}
+        # The MACD EWMs of all terms on a view are run in one pass over its rows
+        spans = {}
+        for term in self.terms:
+            period, interval, _, _, _, macd_short, macd_long, _ = Strategist.TERMS[term]
+            spans.setdefault((period, interval), set()).update((macd_short, macd_long))
+        for (period, interval), view_spans in spans.items():
+            self.panel(period, interval).prepare_ewms(view_spans)
+        pivot_score = None
+        for term in self.terms:
+            period, interval = Strategist.TERMS[term][:2]
+            panel = self.panel(period, interval)
+            if pivot_score is None:
+                pivot_score = panel.pivot_score()
+            for ticker, score in panel.scores(term, pivot_score).items():
+                matrix[ticker][term] = score
+        return matrix
+
+
+def main():
+    from bar_store import BarStore
+    from market_data import YFinanceProvider, ReplayProvider
+    from signals import signal_for
+    from watchlist import tickers as watchlist_tickers
+
+    replay_dir = os.environ.get('REPLAY_DIR')
+    parser = argparse.ArgumentParser(description='Score every Strategist term of the tickers from one minute-bar series each')
+    parser.add_argument('tickers', nargs='*', help='defaults to the watchlist')
+    parser.add_argument('--terms', nargs='+', choices=list(Strategist.TERMS), default=list(Strategist.TERMS))
+    parser.add_argument('--replay', default=replay_dir, help='directory of recorded bars to use instead of yfinance')
+    parser.add_argument('--start', default=os.environ.get('REPLAY_START'), help='replay clock time to score at')
+    parser.add_argument('--bars', help='bar store directory, ./bars or ./replay_bars by default')
+    args = parser.parse_args()
+
+    market_data = ReplayProvider(args.replay, speed=None, start=args.start) if args.replay else YFinanceProvider()
+    bar_store = BarStore(args.bars or ('./replay_bars' if args.replay else './bars'), market_data=market_data)
+    matrix = MultiTermScorer.from_store(bar_store, args.tickers or watchlist_tickers, args.terms).scores()
+
+    print(f"{market_data.now():%Y-%m-%d %H:%M}" + ''.join(f"{term:>24}" for term in args.terms))
+    for ticker, scores in matrix.items():
+        cells = []
+        for term in args.terms:
+            signal = signal_for(scores[term])
+            cells.append(f"{scores[term]:>8.3f} {signal[3] if signal else 'Hold':>15}")
+        print(f"{ticker:<16}" + ''.join(cells))
+
+
+if __name__ == '__main__':
+    main()
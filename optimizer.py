@@ -0,0 +1,168 @@
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from strategist import Strategist
+from signals import THRESHOLDS
+from backtesting import Backtesting, indicator_score_history, aggregate_history
+from market_data import YFinanceProvider, ReplayProvider
+
+COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+
+def default_grid():
+    windows = sorted({parameters[2:] for parameters in Strategist.TERMS.values()})
+    weights = [Strategist.WEIGHTS]
+    for name in Strategist.WEIGHTS:
+        # Each indicator switched off, then doubled
+        weights.append({**Strategist.WEIGHTS, name: 0})
+        weights.append({**Strategist.WEIGHTS, name: Strategist.WEIGHTS[name] * 2})
+    thresholds = [THRESHOLDS, (85, 75, 55, 45, 25, 15), (95, 85, 70, 30, 15, 5)]
+    return list(itertools.product(windows, weights, thresholds))
+
+
+def walk_forward_splits(timeline, splits):
+    # Consecutive equal-length folds: train on fold i, test on fold i + 1
+    edges = [timeline[min(len(timeline) - 1, round(i * len(timeline) / splits))] for i in range(splits)] + [timeline[-1] + pd.Timedelta(1)]
+    return [((edges[i], edges[i + 1]), (edges[i + 1], edges[i + 2])) for i in range(splits - 1)]
+
+
+class SharedBars:
+    # All tickers' OHLC bars in one shared-memory block, so workers attach instead of unpickling frames
+    def __init__(self, frames):
+        self.tickers = list(frames)
+        lengths = [len(frames[ticker]) for ticker in self.tickers]
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+        total = self.offsets[-1]
+        self.values_memory = shared_memory.SharedMemory(create=True, size=max(1, total * len(COLUMNS) * 8))
+        self.index_memory = shared_memory.SharedMemory(create=True, size=max(1, total * 8))
+        values = np.ndarray((total, len(COLUMNS)), dtype='f8', buffer=self.values_memory.buf)
+        index = np.ndarray(total, dtype='i8', buffer=self.index_memory.buf)
+        for ticker, start, end in zip(self.tickers, self.offsets, self.offsets[1:]):
+            frame = frames[ticker]
+            values[start:end] = frame[COLUMNS].to_numpy(dtype='f8')
+            frame_index = frame.index if frame.index.tz is not None else frame.index.tz_localize('UTC')
+            index[start:end] = frame_index.tz_convert('UTC').as_unit('ns').asi8
+
+    def handle(self):
+        return self.values_memory.name, self.index_memory.name, self.tickers, self.offsets
+
+    def close(self):
+        for memory in (self.values_memory, self.index_memory):
+            memory.close()
+            memory.unlink()
+
+
+# Per-worker state, filled once by the pool initializer
+worker_frames = {}
+worker_scores = {}
+worker_memory = []
+
+
+def attach(handle):
+    values_name, index_name, tickers, offsets = handle
+    values_memory = shared_memory.SharedMemory(name=values_name)
+    index_memory = shared_memory.SharedMemory(name=index_name)
+    worker_memory[:] = [values_memory, index_memory]
+    values = np.ndarray((offsets[-1], len(COLUMNS)), dtype='f8', buffer=values_memory.buf)
+    index = np.ndarray(offsets[-1], dtype='i8', buffer=index_memory.buf)
+    worker_frames.clear()
+    worker_scores.clear()
+    for ticker, start, end in zip(tickers, offsets, offsets[1:]):
+        worker_frames[ticker] = pd.DataFrame(values[start:end], columns=COLUMNS, index=pd.DatetimeIndex(index[start:end]).tz_localize('UTC'))
+
+
+def indicator_scores(windows):
+    # Indicators are causal, so they are computed once over the full history and sliced per split
+    if windows not in worker_scores:
+        worker_scores[windows] = {ticker: indicator_score_history(frame, windows) for ticker, frame in worker_frames.items()}
+    return worker_scores[windows]
+
+
+def evaluate(task):
+    (windows, weights, thresholds), (start, end), initial_budget = task
+    companies, frames, scores = [], {}, {}
+    for ticker, frame in worker_frames.items():
+        lo, hi = frame.index.searchsorted(start), frame.index.searchsorted(end)
+        companies.append({'ticker': ticker})
+        frames[ticker] = frame.iloc[lo:hi]
+        scores[ticker] = aggregate_history({name: values[lo:hi] for name, values in indicator_scores(windows)[ticker].items()}, weights)
+
+    backtester = Backtesting(companies, start, end, initial_budget, thresholds=thresholds)
+    backtester.data = frames
+    backtester.simulate_trades(scores)
+    summary = backtester.summary()
+    return {
+        'windows': windows, 'weights': weights, 'thresholds': thresholds, 'start': start, 'end': end,
+        'return_pct': summary['return_pct'], 'max_drawdown_pct': summary['max_drawdown_pct'], 'trades': summary['trades'],
+    }
+
+
+class Optimizer:
+    def __init__(self, frames, initial_budget=100000, splits=4, workers=None, grid=None):
+        self.frames = frames
+        self.initial_budget = initial_budget
+        self.splits = splits
+        self.workers = workers or os.cpu_count()
+        self.grid = grid or default_grid()
+
+    def run(self):
+        timeline = pd.DatetimeIndex(sorted(set().union(*(frame.index for frame in self.frames.values()))))
+        splits = walk_forward_splits(timeline, self.splits)
+        shared = SharedBars(self.frames)
+        try:
+            with ProcessPoolExecutor(self.workers, initializer=attach, initargs=(shared.handle(),)) as pool:
+                started = time.perf_counter()
+                tasks = [(config, train, self.initial_budget) for train, _ in splits for config in self.grid]
+                chunksize = max(1, len(tasks) // (self.workers * 4))
+                in_sample = list(pool.map(evaluate, tasks, chunksize=chunksize))
+                elapsed = time.perf_counter() - started
+
+                # Best in-sample configuration of each split, then scored on the following fold
+                best = []
+                for i, (train, test) in enumerate(splits):
+                    fold = in_sample[i * len(self.grid):(i + 1) * len(self.grid)]
+                    winner = max(fold, key=lambda result: result['return_pct'])
+                    best.append((winner, (winner['windows'], winner['weights'], winner['thresholds']), test))
+                out_of_sample = list(pool.map(evaluate, [(config, test, self.initial_budget) for _, config, test in best]))
+        finally:
+            shared.close()
+
+        return {
+            'in_sample': in_sample,
+            'walk_forward': [{'train': winner, 'test': result} for (winner, _, _), result in zip(best, out_of_sample)],
+            'configs_per_second': len(tasks) / elapsed if elapsed else float('inf'),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Walk-forward sweep of Strategist term windows, weights and thresholds')
+    parser.add_argument('tickers', nargs='+')
+    parser.add_argument('--start', required=True)
+    parser.add_argument('--end', required=True)
+    parser.add_argument('--interval', default='1d')
+    parser.add_argument('--splits', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--replay', help='directory of recorded bars to use instead of yfinance')
+    args = parser.parse_args()
+
+    # A replay provider is read in full: its clock is moved past the end date
+    market_data = ReplayProvider(args.replay, speed=None, start=args.end) if args.replay else YFinanceProvider()
+    frames = {ticker: market_data.history(ticker, interval=args.interval, start=args.start, end=args.end) for ticker in args.tickers}
+    report = Optimizer({ticker: frame for ticker, frame in frames.items() if not frame.empty}, splits=args.splits, workers=args.workers).run()
+
+    for step in report['walk_forward']:
+        train, test = step['train'], step['test']
+        print(f"{train['start']} -> {test['end']}: windows={train['windows']} thresholds={train['thresholds']} weights={train['weights']}")
+        print(f"    in-sample {train['return_pct']:.2f}%, out-of-sample {test['return_pct']:.2f}%")
+    print(f"Throughput: {report['configs_per_second']:.1f} configs/sec")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+from datetime import datetime
+
+import numpy as np
+from termcolor import colored
+
+import metrics
+
+# Order sides: the first two open a position, the last two close one
+OPENING = {'buy': 'long', 'sell_short': 'short'}
+CLOSING = {'sell': 'long', 'buy_short': 'short'}
+
+
+class Order:
+    # Either a fixed quantity or a fraction of the budget at fill time, like main.py sizes its trades.
+    # stop_loss and take_profit are fractions of the fill price, in the position's favour/against it.
+    __slots__ = ('client_id', 'ticker', 'side', 'quantity', 'fraction', 'leverage', 'stop_loss', 'take_profit')
+
+    def __init__(self, client_id, ticker, side, quantity=None, fraction=None, leverage=1, stop_loss=0.0, take_profit=0.0):
+        if side not in OPENING and side not in CLOSING:
+            raise ValueError(f"Unknown order side: {side}")
+        if side in OPENING and (quantity is None) == (fraction is None):
+            raise ValueError("An opening order needs exactly one of quantity and fraction")
+        self.client_id = client_id
+        self.ticker = ticker
+        self.side = side
+        self.quantity = quantity
+        self.fraction = fraction
+        self.leverage = leverage
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+
+
+class OrderQueue:
+    # Orders collected during a cycle and filled together by execute(): every fill is priced from
+    # one price snapshot, and budget, positions, transactions and the orders table are written in a
+    # single transaction. A client id is executed at most once: repeats in the queue are dropped,
+    # and so are ids the orders table already holds, e.g. when a cycle is re-run after a crash.
+    def __init__(self, operations):
+        self.operations = operations
+        self.queue = {}
+        self.duplicates = 0
+        self.filled = 0
+        self.rejected = 0
+        self.skipped = 0
+
+    def submit(self, client_id, ticker, side, **kwargs):
+        if client_id in self.queue:
+            self.duplicates += 1
+            return False
+        self.queue[client_id] = Order(client_id, ticker, side, **kwargs)
+        return True
+
+    def executed_ids(self, client_ids, chunk=500):
+        # Client ids already in the orders table, a few hundred per query to stay under SQLite's variable limit
+        executed = set()
+        for i in range(0, len(client_ids), chunk):
+            part = client_ids[i:i + chunk]
+            placeholders = ', '.join('?' * len(part))
+            rows = self.operations.cur.execute(f'''SELECT client_id FROM orders WHERE client_id IN ({placeholders})''', part)
+            executed.update(row[0] for row in rows)
+        return executed
+
+    @metrics.timed('orders.execute')
+    def execute(self):
+        orders, self.queue = list(self.queue.values()), {}
+        if not orders:
+            return []
+        operations = self.operations
+        executed = self.executed_ids([order.client_id for order in orders])
+        self.duplicates += sum(order.client_id in executed for order in orders)
+        orders = [order for order in orders if order.client_id not in executed]
+        if not orders:
+            return []
+
+        prices = {ticker: operations.get_current_price_one_unit(ticker) for ticker in sorted({order.ticker for order in orders})}
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        # Fills are decided in submission order against a running estimate of the budget, then
+        # written in bulk; the book's own writes move the cash. Deciding inside the transaction means
+        # the book was reloaded first if another connection changed it.
+        with operations.transaction():
+            budget = operations.get_budget()
+            opens = {'long': [], 'short': []}
+            closes = {'long': [], 'short': []}
+            claimed = {'long': set(), 'short': set()}  # Position ids are only unique within a table
+            close_records = {'long': [], 'short': []}  # Index in records of each row in closes
+            records = []
+            for order in orders:
+                price = prices[order.ticker]
+                if order.side in OPENING:
+                    side = OPENING[order.side]
+                    quantity = order.quantity if order.quantity is not None else budget * order.fraction / price
+                    if side == 'long' and price * quantity > budget:
+                        print(f"Insufficient funds for {order.client_id}: {quantity} {order.ticker} at {price}.")
+                        records.append((order.client_id, order.ticker, order.side, quantity, price, order.leverage, 'rejected', timestamp))
+                        continue
+                    budget -= price * quantity
+                    if side == 'long':
+                        stop_loss, take_profit = price * (1 - order.stop_loss), price * (1 + order.take_profit)
+                    else:
+                        stop_loss, take_profit = price * (1 + order.stop_loss), price * (1 - order.take_profit)
+                    opens[side].append((order.ticker, quantity, price, stop_loss, take_profit, order.leverage))
+                    records.append((order.client_id, order.ticker, order.side, quantity, price, order.leverage, 'filled', timestamp))
+                else:
+                    side = CLOSING[order.side]
+                    row = operations.book.find(side, order.ticker, order.quantity, exclude=claimed[side])
+                    if row is None:
+                        print(f"No open {side} position of {order.ticker} for {order.client_id}.")
+                        records.append((order.client_id, order.ticker, order.side, order.quantity, price, None, 'rejected', timestamp))
+                        continue
+                    claimed[side].add(row[0])
+                    budget += operations.close_proceeds(side, row[3], row[2], row[6], price)
+                    closes[side].append(row)
+                    close_records[side].append(len(records))
+                    records.append((order.client_id, order.ticker, order.side, row[2], price, row[6], 'filled', timestamp))
+
+            # Closes credit their proceeds themselves, like the stop checks; add_positions leaves the cost to us.
+            # A row another connection closed in the meantime is skipped there, and its order recorded so.
+            for side, rows in closes.items():
+                if rows:
+                    closed = operations.close_positions(side, rows, np.array([prices[row[1]] for row in rows], dtype=float))
+                    for row, index in zip(rows, close_records[side]):
+                        if row[0] not in closed:
+                            records[index] = records[index][:6] + ('skipped', timestamp)
+            for side, rows in opens.items():
+                if rows:
+                    operations.add_positions(side, rows)
+            operations.adjust_budget(-sum(price * quantity for rows in opens.values() for _, quantity, price, _, _, _ in rows))
+            operations.cur.executemany('''INSERT INTO orders
+                                          (client_id, ticker, side, quantity, price, leverage, status, timestamp)
+                                          VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', records)
+
+        for side, rows in opens.items():
+            for ticker, quantity, price, _, _, leverage in rows:
+                action = 'Bought' if side == 'long' else 'Shorted'
+                print(colored(f"{action} {quantity} shares of {ticker} at {price} each on {timestamp}, leverage {leverage}.", 'light_green' if side == 'long' else 'light_red'))
+        filled = sum(record[6] == 'filled' for record in records)
+        skipped = sum(record[6] == 'skipped' for record in records)
+        self.filled += filled
+        self.skipped += skipped
+        self.rejected += len(records) - filled - skipped
+        print(colored(f"Orders: {filled} filled, {len(records) - filled - skipped} rejected, {skipped} skipped. "
+                      f"Budget: ${operations.get_budget()}.", 'cyan'))
+        return records
+
+    def stats(self):
+        return {'filled': self.filled, 'rejected': self.rejected, 'skipped': self.skipped, 'duplicates': self.duplicates,
+                'queued': len(self.queue)}
@@ -0,0 +1,221 @@
+from datetime import timedelta
+
+import numpy as np
+
+from strategist import Strategist
+from indicators.moving_average import MovingAverage
+from indicators.rsi import RSI
+from indicators.macd import MACD
+from indicators.bollinger_bands import BollingerBands
+from indicators.stochastic_oscillator import StochasticOscillator
+from indicators.pivot_points import PivotPoints
+
+
+def stack_columns(columns):
+    # Align series on their most recent bar: row -1 is every ticker's last bar,
+    # shorter histories are padded with NaN at the top.
+    length = max((len(column) for column in columns), default=0)
+    stacked = np.full((length, len(columns)), np.nan)
+    present = np.zeros((length, len(columns)), dtype=bool)
+    for i, column in enumerate(columns):
+        if len(column):
+            stacked[-len(column):, i] = column
+            present[-len(column):, i] = True
+    return stacked, present
+
+
+def last_window(values, window):
+    # The last `window` rows, NaN-padded when the history is shorter
+    if len(values) >= window:
+        return values[-window:]
+    return np.vstack([np.full((window - len(values), values.shape[1]), np.nan), values])
+
+
+def ewm(values, span):
+    # Column-wise Series.ewm(span=span, adjust=False).mean(), vectorized across tickers
+    return ewms(values, [span])[0]
+
+
+def ewms(values, spans):
+    # ewm() for several spans in a single pass over the rows, one (rows, tickers) array per span
+    com = (np.asarray(spans, dtype=float)[:, None] - 1) / 2.0
+    alpha = 1.0 / (1.0 + com)
+    old_wt_factor = 1.0 - alpha
+    weighted = np.full((len(spans), values.shape[1]), np.nan)
+    old_wt = np.ones((len(spans), values.shape[1]))
+    out = np.empty((len(spans),) + values.shape)
+    for t in range(len(values)):
+        current = values[t]
+        started = ~np.isnan(weighted)
+        observed = ~np.isnan(current)
+        old_wt = np.where(started, old_wt * old_wt_factor, old_wt)
+        blend = started & observed & (weighted != current)
+        weighted = np.where(blend, (old_wt * weighted + alpha * current) / (old_wt + alpha), weighted)
+        old_wt = np.where(started & observed, 1.0, old_wt)
+        weighted = np.where(~started & observed, current, weighted)
+        out[:, t] = weighted
+    return out
+
+
+class Panel:
+    def __init__(self, tickers, close, high, low, present, yesterday_close, yesterday_high, yesterday_low):
+        self.tickers = list(tickers)
+        self.close = close
+        self.high = high
+        self.low = low
+        self.present = present
+        self.yesterday_close = yesterday_close
+        self.yesterday_high = yesterday_high
+        self.yesterday_low = yesterday_low
+        self.cache = {}
+
+    @classmethod
+    def from_frames(cls, frames, yesterday_frames):
+        # DataFrames, or anything else indexed by column name, e.g. bar store records (BarStore.period_bars)
+        tickers = list(frames)
+        close, present = stack_columns([np.asarray(frames[t]['Close'], dtype=float) for t in tickers])
+        high, _ = stack_columns([np.asarray(frames[t]['High'], dtype=float) for t in tickers])
+        low, _ = stack_columns([np.asarray(frames[t]['Low'], dtype=float) for t in tickers])
+        yesterday_close, _ = stack_columns([np.asarray(yesterday_frames[t]['Close'], dtype=float) for t in tickers])
+        yesterday_high, _ = stack_columns([np.asarray(yesterday_frames[t]['High'], dtype=float) for t in tickers])
+        yesterday_low, _ = stack_columns([np.asarray(yesterday_frames[t]['Low'], dtype=float) for t in tickers])
+        return cls(tickers, close, high, low, present, yesterday_close, yesterday_high, yesterday_low)
+
+    @classmethod
+    def from_strategists(cls, strategists):
+        return cls.from_frames(
+            {strategist.ticker: strategist.data for strategist in strategists},
+            {strategist.ticker: strategist.yesterday_data for strategist in strategists},
+        )
+
+    def cached(self, key, compute):
+        # Intermediate results are shared by every term scored on this panel, e.g. the 20-bar mean
+        # of the short term's long MA and of the Bollinger bands, or EWMs of equal spans
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    def close_mean(self, window):
+        return self.cached(('mean', window), lambda: last_window(self.close, window).mean(axis=0))
+
+    def close_ewm(self, span):
+        return self.cached(('ewm', span), lambda: ewm(self.close, span))
+
+    def prepare_ewms(self, spans):
+        # Computes the close EWMs of every span still missing in one pass, see ewms()
+        missing = sorted({span for span in spans if ('ewm', span) not in self.cache})
+        if missing:
+            for span, values in zip(missing, ewms(self.close, missing)):
+                self.cache[('ewm', span)] = values
+
+    def moving_average_score(self, short_window, long_window):
+        return MovingAverage.score(self.close_mean(short_window), self.close_mean(long_window))
+
+    def gains_and_losses(self):
+        delta = np.diff(self.close, axis=0, prepend=np.nan)
+        # NaN deltas count as 0 like Series.where(); padding rows stay missing
+        gain = np.where(self.present, np.where(delta > 0, delta, 0.0), np.nan)
+        loss = np.where(self.present, -np.where(delta < 0, delta, 0.0), np.nan)
+        return gain, loss
+
+    def rsi_score(self, window):
+        gain, loss = self.cached(('gains_and_losses',), self.gains_and_losses)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = last_window(gain, window).mean(axis=0) / last_window(loss, window).mean(axis=0)
+            rsi = 100 - (100 / (1 + rs))
+        return RSI.score(rsi)
+
+    def macd_score(self, short_span, long_span, signal_span):
+        macd = self.close_ewm(short_span) - self.close_ewm(long_span)
+        signal = self.cached(('signal', short_span, long_span, signal_span), lambda: ewm(macd, signal_span))
+        return MACD.score(macd[-1], signal[-1])
+
+    def bollinger_score(self, window=20):
+        return self.cached(('bollinger', window), lambda: self._bollinger_score(window))
+
+    def _bollinger_score(self, window):
+        middle = self.close_mean(window)
+        std = last_window(self.close, window).std(axis=0, ddof=1)
+        return BollingerBands.score(self.close[-1], middle + std * 2, middle - std * 2, middle)
+
+    def stochastic_score(self, window=14):
+        return self.cached(('stochastic', window), lambda: self._stochastic_score(window))
+
+    def _stochastic_score(self, window):
+        low_min = last_window(self.low, window).min(axis=0)
+        high_max = last_window(self.high, window).max(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k = 100 * (self.close[-1] - low_min) / (high_max - low_min)
+        return StochasticOscillator.score(k)
+
+    def pivot_score(self):
+        return self.cached(('pivot',), self._pivot_score)
+
+    def _pivot_score(self):
+        with np.errstate(invalid='ignore'):
+            max_value = np.fmax.reduce(self.yesterday_high, axis=0, initial=-np.inf)
+            min_value = np.fmin.reduce(self.yesterday_low, axis=0, initial=np.inf)
+        max_value[np.isinf(max_value)] = np.nan
+        min_value[np.isinf(min_value)] = np.nan
+        close = self.yesterday_close[-1] if len(self.yesterday_close) else np.full(len(self.tickers), np.nan)
+        pivot = (max_value + min_value + close) / 3
+        return PivotPoints.score(
+            close,
+            pivot,
+            2 * pivot - max_value,
+            pivot - (max_value - min_value),
+            min_value - 2 * (max_value - pivot),
+            2 * pivot - min_value,
+            pivot + (max_value - min_value),
+            max_value + 2 * (pivot - min_value),
+        )
+
+    def scores(self, term='short', pivot_score=None):
+        # pivot_score: precomputed pivot scores, when several panels share the same previous session
+        _, _, short_window, long_window, rsi_window, macd_short, macd_long, macd_signal = Strategist.TERMS[term]
+        final = Strategist.aggregate_scores(
+            self.moving_average_score(short_window, long_window),
+            self.rsi_score(rsi_window),
+            self.macd_score(macd_short, macd_long, macd_signal),
+            self.bollinger_score(20),
+            self.stochastic_score(14),
+            self.pivot_score() if pivot_score is None else pivot_score,
+        )
+        return dict(zip(self.tickers, final.tolist()))
+
+
+class PanelService:
+    # The whole of a worker's tickers scored with one Panel per update(), instead of one
+    # StrategistService per ticker. The bars are stacked straight from the store's records, without a
+    # DataFrame per ticker, so fetching them (see fetch()) can run concurrently beforehand; the
+    # previous session, which only the pivot points use, is read once per day.
+    def __init__(self, tickers, term, bar_store):
+        if term not in Strategist.TERMS:
+            raise ValueError("Term must be 'very_short', 'short', 'medium', or 'long'")
+        self.tickers = list(tickers)
+        self.term = term
+        self.period, self.interval = Strategist.TERMS[term][:2]
+        self.bar_store = bar_store
+        self.yesterday_date = None
+        self.yesterday_frames = None
+
+    def fetch(self, ticker):
+        self.bar_store.update(ticker, self.interval, self.period)
+
+    def update_yesterday(self):
+        yesterday = self.bar_store.market_data.now().date() - timedelta(days=1)
+        if yesterday == self.yesterday_date:
+            return
+        frames = {}
+        for ticker in self.tickers:
+            self.bar_store.update(ticker, '1m', '1d')
+            day = self.bar_store.day(ticker, '1m', yesterday)
+            frames[ticker] = {column: day[column].to_numpy(dtype=float) for column in ('Close', 'High', 'Low')}
+        self.yesterday_frames = frames
+        self.yesterday_date = yesterday
+
+    def update(self):
+        # {ticker: score}, NaN for tickers without bars
+        self.update_yesterday()
+        frames = {ticker: self.bar_store.period_bars(ticker, self.period, self.interval) for ticker in self.tickers}
+        return Panel.from_frames(frames, self.yesterday_frames).scores(self.term)
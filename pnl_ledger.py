@@ -0,0 +1,112 @@
+import math
+
+
+class PnLLedger:
+    # Running mark-to-market of the open book. Positions are aggregated per (ticker, side, leverage)
+    # into a quantity and a cost (sum of entry_price * quantity), which is all valuation needs:
+    #   long  value = cost * (1 - leverage) + leverage * quantity * price
+    #   short value = cost * (1 + leverage) - leverage * quantity * price
+    # so each ticker's value is const + slope * price. A fill moves its ticker's line, a price tick
+    # moves its point on the line, and the running total follows both; neither costs more with
+    # more positions. Realized P&L is kept per group too; groups changed since the last commit
+    # are listed in `dirty` for TradeOperations to persist.
+    def __init__(self):
+        self.groups = {}  # ticker -> {(side, leverage): [positions, quantity, cost]}
+        self.lines = {}  # ticker -> [const, slope]
+        self.prices = {}  # ticker -> last marked price
+        self.realized = {}  # (ticker, side, leverage) -> realized P&L
+        self.dirty = set()
+        self.marked = 0.0
+
+    def load(self, book, realized=()):
+        # Rebuilt from the position book and the stored realized P&L, e.g. after a rollback;
+        # prices already marked are kept
+        self.groups.clear()
+        self.lines.clear()
+        self.realized = {(ticker, side, leverage): amount for ticker, side, leverage, amount in realized}
+        self.dirty.clear()
+        for side in book.SIDES:
+            for row in book.rows(side):
+                self.apply(side, row, 1)
+        self.resync()
+
+    def apply(self, side, row, sign):
+        # Adds (sign 1) or removes (sign -1) one book row
+        _, ticker, quantity, entry_price, _, _, leverage = row
+        groups = self.groups.setdefault(ticker, {})
+        group = groups.setdefault((side, leverage), [0, 0.0, 0.0])
+        group[0] += sign
+        group[1] += sign * quantity
+        group[2] += sign * entry_price * quantity
+        const = entry_price * quantity * (1 - leverage if side == 'long' else 1 + leverage)
+        slope = leverage * quantity if side == 'long' else -leverage * quantity
+        line = self.lines.setdefault(ticker, [0.0, 0.0])
+        line[0] += sign * const
+        line[1] += sign * slope
+        # A ticker first seen on a fill is marked at its fill price
+        price = self.prices.setdefault(ticker, entry_price)
+        self.marked += sign * (const + slope * price)
+        if not group[0]:
+            del groups[(side, leverage)]
+            if not groups:
+                # Last position of the ticker closed: its line goes, with whatever rounding it collected
+                del self.groups[ticker]
+                const, slope = self.lines.pop(ticker)
+                self.marked -= const + slope * price
+
+    def open(self, side, row):
+        self.apply(side, row, 1)
+
+    def close(self, side, row, price):
+        # Removes a book row closed at `price` and books its gain as realized
+        _, ticker, quantity, entry_price, _, _, leverage = row
+        direction = 1 if side == 'long' else -1
+        gain = direction * (price - entry_price) * quantity * leverage
+        key = (ticker, side, leverage)
+        self.realized[key] = self.realized.get(key, 0.0) + gain
+        self.dirty.add(key)
+        self.apply(side, row, -1)
+        return gain
+
+    def mark(self, ticker, price):
+        line = self.lines.get(ticker)
+        if line is not None:
+            self.marked += line[1] * (price - self.prices[ticker])
+        self.prices[ticker] = price
+
+    def tickers(self):
+        return list(self.lines)
+
+    def total_value(self, budget):
+        return budget + self.marked
+
+    def resync(self):
+        # Exact sum of the lines, dropping the rounding the running total picks up over many updates
+        self.marked = math.fsum(const + slope * self.prices[ticker] for ticker, (const, slope) in self.lines.items())
+        return self.marked
+
+    def positions(self):
+        # (ticker, side, leverage, quantity, cost, value, unrealized, exposure, realized) per open group;
+        # exposure is the leveraged notional at the marked price
+        rows = []
+        for ticker, groups in self.groups.items():
+            for (side, leverage), (_, quantity, cost) in groups.items():
+                notional = quantity * self.prices[ticker]
+                unrealized = leverage * (notional - cost) if side == 'long' else leverage * (cost - notional)
+                rows.append((ticker, side, leverage, quantity, cost, cost + unrealized, unrealized, leverage * notional,
+                             self.realized.get((ticker, side, leverage), 0.0)))
+        return rows
+
+    def summary(self):
+        positions = self.positions()
+        return {
+            'realized': math.fsum(self.realized.values()),
+            'unrealized': math.fsum(row[6] for row in positions),
+            'exposure': math.fsum(row[7] for row in positions),
+        }
+
+    def flush(self):
+        # (ticker, side, leverage, amount) of the groups whose realized P&L changed since the last flush
+        rows = [key + (self.realized[key],) for key in self.dirty]
+        self.dirty.clear()
+        return rows
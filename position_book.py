@@ -0,0 +1,49 @@
+class PositionBook:
+    # In-memory mirror of the portfolio and short_positions tables.
+    # Rows are (id, ticker, quantity, entry_price, stop_loss, take_profit, leverage),
+    # keyed by position id, with a per-ticker index for the ticker lookups.
+    SIDES = ('long', 'short')
+
+    def __init__(self, portfolio=(), short_positions=()):
+        self.positions = {side: {} for side in self.SIDES}
+        self.by_ticker = {side: {} for side in self.SIDES}
+        self.load(portfolio, short_positions)
+
+    def load(self, portfolio, short_positions):
+        for side in self.SIDES:
+            self.positions[side].clear()
+            self.by_ticker[side].clear()
+        for row in portfolio:
+            self.add('long', row)
+        for row in short_positions:
+            self.add('short', row)
+
+    def add(self, side, row):
+        self.positions[side][row[0]] = tuple(row)
+        self.by_ticker[side].setdefault(row[1], {})[row[0]] = None  # dict as an insertion-ordered set
+
+    def remove(self, side, position_id):
+        row = self.positions[side].pop(position_id)
+        ids = self.by_ticker[side][row[1]]
+        del ids[position_id]
+        if not ids:
+            del self.by_ticker[side][row[1]]
+        return row
+
+    def find(self, side, ticker, quantity=None, exclude=()):
+        # Oldest open position for the ticker, optionally with exactly that quantity; ids in
+        # `exclude` are skipped, e.g. positions already claimed by earlier orders of a batch
+        for position_id in self.by_ticker[side].get(ticker, ()):
+            row = self.positions[side][position_id]
+            if (quantity is None or row[2] == quantity) and position_id not in exclude:
+                return row
+        return None
+
+    def rows(self, side):
+        return list(self.positions[side].values())
+
+    def tickers(self):
+        return sorted(set(self.by_ticker['long']) | set(self.by_ticker['short']))
+
+    def __len__(self):
+        return len(self.positions['long']) + len(self.positions['short'])
@@ -0,0 +1,83 @@
+import time
+
+import metrics
+
+
+class StaticQuotes:
+    # Local fake feed, mainly for tests: prices are whatever was last set
+    def __init__(self, prices=None):
+        self.prices = dict(prices or {})
+        self.calls = 0
+
+    def set(self, ticker, price):
+        self.prices[ticker] = price
+
+    def latest_prices(self, tickers):
+        self.calls += 1
+        return {ticker: self.prices[ticker] for ticker in tickers if ticker in self.prices}
+
+
+class PriceSnapshot:
+    def __init__(self, backend=None, ttl=30):
+        # Without a backend quotes come from yfinance, set up on the first fetch: market_data brings
+        # pandas, which commands that only read the database never need
+        self.backend = backend
+        self.ttl = ttl
+        self.watched = set()
+        self.prices = {}
+        self.fetched_at = {}
+        self.hits = 0
+        self.misses = 0
+
+    def watch(self, tickers):
+        self.watched.update(tickers)
+
+    def is_fresh(self, ticker, now=None):
+        fetched_at = self.fetched_at.get(ticker)
+        now = time.monotonic() if now is None else now
+        return fetched_at is not None and now - fetched_at < self.ttl
+
+    def refresh(self, tickers=()):
+        # One bulk fetch for the requested tickers plus everything watched
+        self.watch(tickers)
+        tickers = sorted(self.watched)
+        now = time.monotonic()
+        fetched = self.fetch(tickers)
+        for ticker, price in fetched.items():
+            self.prices[ticker] = price
+            self.fetched_at[ticker] = now
+
+    def fetch(self, tickers):
+        if self.backend is None:
+            from market_data import YFinanceProvider
+            self.backend = YFinanceProvider()
+        with metrics.stage('prices.fetch'):
+            return self.backend.latest_prices(tickers)
+
+    def invalidate(self):
+        self.fetched_at.clear()
+
+    def get(self, ticker):
+        if self.is_fresh(ticker):
+            self.hits += 1
+            return self.prices[ticker]
+
+        self.misses += 1
+        now = time.monotonic()
+        stale = [t for t in self.watched | {ticker} if not self.is_fresh(t, now)]
+        self.watch([ticker])
+        fetched = self.fetch(stale)
+        for fetched_ticker, price in fetched.items():
+            self.prices[fetched_ticker] = price
+            self.fetched_at[fetched_ticker] = now
+        if ticker not in self.prices:
+            raise KeyError(f"No price available for {ticker}")
+        return self.prices[ticker]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
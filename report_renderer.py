@@ -0,0 +1,94 @@
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+import metrics
+
+CHART_SIZE = (10, 5)
+TABLE_SIZE = (10, 2)
+# Fixed chart margins instead of tight_layout, which measures every tick label of every page
+CHART_MARGINS = {'left': 0.07, 'right': 0.98, 'bottom': 0.08, 'top': 0.93, 'hspace': 0.4}
+
+
+class ReportRenderer:
+    # Strategy report pages drawn with the object-oriented API on figures that belong to no pyplot
+    # state, so renderers in separate processes never share anything. The figures and their axes are
+    # built once and cleared between pages: one figure for the tables and the advice banner, one
+    # for the indicator charts with an axes grid per panel count (RSI draws two).
+    def __init__(self):
+        self.table = self.figure(TABLE_SIZE)
+        self.table_ax = self.table.add_subplot()
+        self.chart = self.figure(CHART_SIZE)
+        self.chart.subplots_adjust(**CHART_MARGINS)
+        self.grids = {}
+
+    @staticmethod
+    def figure(size):
+        figure = Figure(figsize=size)
+        FigureCanvasAgg(figure)
+        return figure
+
+    def chart_axes(self, panels):
+        if panels not in self.grids:
+            self.grids[panels] = list(self.chart.subplots(panels, 1, squeeze=False)[:, 0])
+        for count, axes in self.grids.items():
+            for ax in axes:
+                ax.set_visible(count == panels)
+        for ax in self.grids[panels]:
+            self.reset(ax)
+        return self.grids[panels]
+
+    @staticmethod
+    def reset(ax):
+        # Drops the previous page's data but keeps the axes' ticks, which ax.clear() would rebuild
+        for artist in [*ax.lines, *ax.collections, *ax.patches, *ax.texts, *ax.tables]:
+            artist.remove()
+        if ax.legend_ is not None:
+            ax.legend_.remove()
+        ax.set_prop_cycle(None)  # Line colours start over, as on new axes
+        ax.relim()
+        ax.autoscale()
+
+    def table_page(self, pdf, rows, labels):
+        ax = self.table_ax
+        self.reset(ax)
+        ax.axis('tight')
+        ax.axis('off')
+        table = ax.table(cellText=rows, colLabels=labels, cellLoc='center', loc='center')
+        table.auto_set_font_size(False)
+        table.set_fontsize(10)
+        table.auto_set_column_width(col=list(range(len(labels))))
+        pdf.savefig(self.table)
+
+    def text_page(self, pdf, text):
+        ax = self.table_ax
+        self.reset(ax)
+        ax.text(0.5, 0.5, text, fontsize=24, ha='center', va='center', fontweight='bold', color='blue')
+        ax.axis('off')
+        pdf.savefig(self.table)
+
+    def chart_page(self, pdf, indicator):
+        axes = self.chart_axes(getattr(indicator, 'PANELS', 1))
+        indicator.plot(axes[0] if len(axes) == 1 else axes)
+        pdf.savefig(self.chart)
+
+    @metrics.timed('report.write_pdf')
+    def render(self, path, general_advice, recommendations, indicators, pivot_levels):
+        with PdfPages(path) as pdf:
+            # Recommendations first, then the general advice prominently, the charts and the pivot levels
+            self.table_page(pdf, recommendations, ['Strategy', 'Score', 'Current Value'])
+            self.text_page(pdf, f'General Advice: {general_advice}')
+            for indicator in indicators:
+                self.chart_page(pdf, indicator)
+            self.table_page(pdf, [pivot_levels.values()], pivot_levels.LABELS)
+
+
+renderer = None
+
+
+def get_renderer():
+    # One renderer per process, created with the first report
+    global renderer
+    if renderer is None:
+        renderer = ReportRenderer()
+    return renderer
@@ -0,0 +1,115 @@
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+
+
+def use_agg_backend():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render_report(snapshot, score):
+    # Runs in a worker process: indicators (if not already memoized) and every figure are computed here
+    # The render time is returned, the worker's own metrics registry is never exported
+    started = time.perf_counter()
+    strategist = pickle.loads(snapshot)
+    strategist.generate_pdf_report(score)
+    return time.perf_counter() - started
+
+
+class ReportWorker:
+    def __init__(self, every=1, workers=1):
+        self.every = every
+        self.executor = ProcessPoolExecutor(workers, initializer=use_agg_backend)
+        # Start the processes now rather than on the first report, before the caller spawns threads
+        self.executor.submit(int).result()
+        self.lock = threading.Lock()
+        self.in_flight = set()
+        self.pending = {}
+        self.submitted = 0
+        self.rendered = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def submit(self, strategist, score, cycle=0):
+        # Render every `every` cycles; a ticker that is still rendering keeps only its newest snapshot.
+        # A source with a snapshot() method (a StrategistService) only builds its Strategist when the
+        # render starts, on this thread, so coalesced submissions cost nothing.
+        if cycle % self.every:
+            self.skipped += 1
+            return
+        ticker = strategist.ticker
+        deferred = hasattr(strategist, 'snapshot')
+        # Pickled now, so later updates of the strategist never leak into the report
+        snapshot = None if deferred else pickle.dumps(strategist)
+        with self.lock:
+            self.submitted += 1
+            if ticker in self.pending:
+                self.coalesced += 1
+            if ticker in self.in_flight:
+                self.pending[ticker] = (snapshot, score)
+                return
+            self.pending.pop(ticker, None)
+            self.in_flight.add(ticker)
+        if deferred:
+            snapshot = pickle.dumps(strategist.snapshot())
+        self._start(ticker, snapshot, score)
+
+    def _start(self, ticker, snapshot, score):
+        future = self.executor.submit(render_report, snapshot, score)
+        future.add_done_callback(lambda future: self._done(ticker, future))
+
+    def _done(self, ticker, future):
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+            if not future.cancelled():
+                print(f"Report for {ticker} failed: {future.exception()}")
+        else:
+            self.rendered += 1
+            if metrics.registry.enabled:
+                metrics.observe('report.render', future.result())
+        with self.lock:
+            queued = self.pending.get(ticker)
+            if queued is None or queued[0] is None:
+                # A deferred source is left for the next submit, it is never built on this callback thread
+                self.in_flight.discard(ticker)
+                return
+            del self.pending[ticker]
+        try:
+            self._start(ticker, *queued)
+        except RuntimeError:
+            # The pool was shut down in the meantime, e.g. at interpreter exit
+            with self.lock:
+                self.skipped += 1
+                self.in_flight.discard(ticker)
+
+    def render_all(self, strategists, scores):
+        # A full report set, one render per strategist spread over the pool, outside the per-ticker
+        # coalescing; blocks until every report is written and returns the render times
+        snapshots = [pickle.dumps(strategist.snapshot() if hasattr(strategist, 'snapshot') else strategist) for strategist in strategists]
+        times = list(self.executor.map(render_report, snapshots, scores))
+        with self.lock:
+            self.rendered += len(times)
+        return times
+
+    def stats(self):
+        with self.lock:
+            return {
+                'submitted': self.submitted,
+                'rendered': self.rendered,
+                'coalesced': self.coalesced,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'in_flight': len(self.in_flight),
+            }
+
+    def close(self, wait=True):
+        # Reports still queued behind a running one are dropped, only running renders finish
+        with self.lock:
+            self.skipped += len(self.pending)
+            self.pending.clear()
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
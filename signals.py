@@ -0,0 +1,36 @@
+import numpy as np
+
+STOP_LOSS = 0.002  # 0.2% stop loss
+TAKE_PROFIT = 0.005  # 0.5% take profit
+
+# Score cut-offs: very strong / strong / plain buy above, then plain / strong / very strong sell below
+THRESHOLDS = (90, 80, 60, 40, 20, 10)
+LEVERAGES = (3, 2, 1)
+FRACTIONS = (0.08, 0.05, 0.02)  # Share of the budget committed per signal strength
+LABELS = ('Very Strong', 'Strong', '')
+
+
+def signal_for(score, thresholds=THRESHOLDS):
+    # Returns (side, leverage, budget fraction, label) or None to hold; side is 1 for buy, -1 for short
+    very_strong_buy, strong_buy, buy, sell, strong_sell, very_strong_sell = thresholds
+    for threshold, leverage, fraction, label in zip((very_strong_buy, strong_buy, buy), LEVERAGES, FRACTIONS, LABELS):
+        if score > threshold:
+            return 1, leverage, fraction, f'{label} Buy'.strip()
+    for threshold, leverage, fraction, label in zip((very_strong_sell, strong_sell, sell), LEVERAGES, FRACTIONS, LABELS):
+        if score < threshold:
+            return -1, leverage, fraction, f'{label} Sell'.strip()
+    return None
+
+
+def signal_arrays(scores, thresholds=THRESHOLDS):
+    # Vectorized signal_for over a score series: (side, leverage, fraction) arrays, side 0 means hold
+    very_strong_buy, strong_buy, buy, sell, strong_sell, very_strong_sell = thresholds
+    scores = np.asarray(scores, dtype=float)
+    conditions = [
+        scores > very_strong_buy, scores > strong_buy, scores > buy,
+        scores < very_strong_sell, scores < strong_sell, scores < sell,
+    ]
+    side = np.select(conditions, [1, 1, 1, -1, -1, -1], 0)
+    leverage = np.select(conditions, LEVERAGES + LEVERAGES, 0)
+    fraction = np.select(conditions, FRACTIONS + FRACTIONS, 0.0)
+    return side, leverage, fraction
@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Start-up budget of the entry points: each is imported in a fresh interpreter, in an empty directory,
+# and must load within its time budget and without the heavy modules it has no use for at start-up.
+# They are imported where they are needed instead: yfinance on the first quote fetch, pandas with
+# the market data, pyplot for standalone plots only and the PDF backend with the first report.
+#
+#     python startup_check.py
+#     python -X importtime -c "import main"   # where the time of a slow entry point goes
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+HEAVY = ('pandas', 'yfinance', 'matplotlib', 'matplotlib.pyplot', 'matplotlib.backends.backend_pdf')
+SCORING = ('yfinance', 'matplotlib', 'matplotlib.pyplot', 'matplotlib.backends.backend_pdf')
+
+# name -> (code run at start-up, budget in seconds, modules it must not import)
+ENTRY_POINTS = {
+    # The emergency command up to its first quote fetch
+    'sell_everything': ("from trade_operations import TradeOperations; TradeOperations('startup.db')", 0.3, HEAVY),
+    'supervisor': ('import supervisor', 0.3, HEAVY),
+    'main': ('import main', 0.6, SCORING),
+    'strategist': ('import strategist', 0.6, SCORING),
+    'main_historical': ('import backtesting', 0.6, SCORING),
+    'optimizer': ('import optimizer', 0.6, SCORING),
+}
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+exec({code!r})
+print(json.dumps({{'seconds': time.perf_counter() - started, 'modules': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def probe(code, workdir):
+    env = {name: value for name, value in os.environ.items() if name not in ('REPLAY_DIR', 'WATCHLIST')}
+    env['PYTHONPATH'] = REPO
+    result = subprocess.run([sys.executable, '-c', PROBE.format(code=code, heavy=HEAVY)], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check(name, repeats, scale):
+    # The fastest of `repeats` runs, which other load on the machine disturbs the least
+    code, budget, forbidden = ENTRY_POINTS[name]
+    runs = []
+    for _ in range(repeats):
+        with tempfile.TemporaryDirectory() as workdir:
+            runs.append(probe(code, workdir))
+    seconds = min(run['seconds'] for run in runs)
+    loaded = sorted({module for run in runs for module in run['modules'] if module in forbidden})
+    problems = []
+    if seconds > budget * scale:
+        problems.append(f"over its {budget * scale:.2f}s budget")
+    if loaded:
+        problems.append(f"imports {', '.join(loaded)}")
+    print(f"{name}: {seconds * 1000:.0f} ms {'; '.join(problems) if problems else 'ok'}")
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import time of the entry points against their budgets')
+    parser.add_argument('--only', help='check only entry points whose name contains this text')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier of every budget, for slower machines')
+    args = parser.parse_args()
+
+    failed = [name for name in ENTRY_POINTS if (not args.only or args.only in name) and not check(name, args.repeats, args.scale)]
+    if failed:
+        print(f"{len(failed)} entry point(s) over budget: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
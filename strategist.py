@@ -1,9 +1,5 @@
-import yfinance as yf
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import timedelta
 import os
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
 
 from indicators.moving_average import MovingAverage
 from indicators.rsi import RSI
@@ -11,79 +7,133 @@ from indicators.macd import MACD
 from indicators.bollinger_bands import BollingerBands
 from indicators.stochastic_oscillator import StochasticOscillator
 from indicators.pivot_points import PivotPoints
+from market_data import YFinanceProvider
+import metrics
 
 class Strategist:
-    def __init__(self, ticker, term='short', pivot_type='Traditional'):
+    # period, interval, short_window, long_window, rsi_window, macd_short, macd_long, macd_signal
+    TERMS = {
+        'very_short': ('1d', '1m', 3, 10, 9, 3, 10, 5),
+        'short': ('1d', '1m', 5, 20, 14, 12, 26, 9),
+        'medium': ('1mo', '1h', 12, 26, 14, 12, 26, 9),
+        'long': ('1y', '1d', 50, 200, 14, 12, 26, 9),
+    }
+
+    # Weights for each indicator
+    WEIGHTS = {
+        'ma': 1,
+        'rsi': 1,
+        'macd': 2,
+        'bb': 1,
+        'so': 0.5,
+        'pivot': 3
+    }
+
+    def __init__(self, ticker, term='short', pivot_type='Traditional', bar_store=None, market_data=None):
         self.ticker = ticker
         self.term = term
         self.pivot_type = pivot_type
         self.setup_term_parameters(term)
-        self.data = yf.Ticker(ticker).history(period=self.period, interval=self.interval)
-        self.daily_data = yf.Ticker(ticker).history(period='1d', interval='1m')  # Fetch daily data for pivot points
-        last_5_days = yf.Ticker(ticker).history(period='5d', interval='1m')
-        last_5_days.sort_index(inplace=True)
 
-        # Calculate yesterday's date
-        today = datetime.now().date()
+        # Indicator results are memoized per data version, see calculate_indicators
+        self.data_version = 0
+        self.computed_version = None
+        self.indicators = {}
+        self.scores = {}
+        self.skipped_computations = 0
+
+        if market_data is None:
+            market_data = bar_store.market_data if bar_store is not None else YFinanceProvider()
+
+        # Calculate yesterday's date, on the provider's clock so replays see their own yesterday
+        today = market_data.now().date()
         yesterday = today - timedelta(days=1)
 
+        with metrics.stage('strategist.fetch'):
+            self.fetch_data(ticker, yesterday, bar_store, market_data)
+
+    def fetch_data(self, ticker, yesterday, bar_store, market_data):
+        if bar_store is not None:
+            # Served from the local store, only bars newer than the last stored one are downloaded
+            self.data = bar_store.history(ticker, self.period, self.interval)
+            self.daily_data = bar_store.history(ticker, '1d', '1m')
+            self.yesterday_data = bar_store.day(ticker, '1m', yesterday)
+            return
+
+        self.data = market_data.history(ticker, period=self.period, interval=self.interval)
+        self.daily_data = market_data.history(ticker, period='1d', interval='1m')  # Fetch daily data for pivot points
+        last_5_days = market_data.history(ticker, period='5d', interval='1m')
+        last_5_days.sort_index(inplace=True)
+
         # Filter out the data for yesterday
         self.yesterday_data = last_5_days[(last_5_days.index.date == yesterday)]
 
     def setup_term_parameters(self, term):
-        terms = {
-            'very_short': ('1d', '1m', 3, 10, 9, 3, 10, 5),
-            'short': ('1d', '1m', 5, 20, 14, 12, 26, 9),
-            'medium': ('1mo', '1h', 12, 26, 14, 12, 26, 9),
-            'long': ('1y', '1d', 50, 200, 14, 12, 26, 9),
-        }
-        if term in terms:
-            self.period, self.interval, self.short_window, self.long_window, self.rsi_window, self.macd_short, self.macd_long, self.macd_signal = terms[term]
+        if term in self.TERMS:
+            self.period, self.interval, self.short_window, self.long_window, self.rsi_window, self.macd_short, self.macd_long, self.macd_signal = self.TERMS[term]
         else:
             raise ValueError("Term must be 'very_short', 'short', 'medium', or 'long'")
 
+    def update_data(self, data, daily_data=None, yesterday_data=None):
+        self.data = data
+        if daily_data is not None:
+            self.daily_data = daily_data
+        if yesterday_data is not None:
+            self.yesterday_data = yesterday_data
+        self.data_version += 1
+
+    def indicator_specs(self):
+        # Report order; pivot points are computed from yesterday's session
+        return [
+            (RSI, {'window': self.rsi_window}),
+            (BollingerBands, {'window': 20}),
+            (PivotPoints, {}),
+            (MACD, {'short_span': self.macd_short, 'long_span': self.macd_long, 'signal_span': self.macd_signal}),
+            (MovingAverage, {'short_window': self.short_window, 'long_window': self.long_window}),
+            (StochasticOscillator, {'window': 14}),
+        ]
+
+    @metrics.timed('strategist.calculate_indicators')
     def calculate_indicators(self):
-        ma = MovingAverage(self.data, self.short_window, self.long_window)
-        self.data = ma.calculate()
-        
-        rsi = RSI(self.data, self.rsi_window)
-        self.data = rsi.calculate()
-        
-        macd = MACD(self.data, self.macd_short, self.macd_long, self.macd_signal)
-        self.data = macd.calculate()
-        
-        bb = BollingerBands(self.data, 20)
-        self.data = bb.calculate()
-        
-        so = StochasticOscillator(self.data, 14)
-        self.data = so.calculate()
-        
-        pp = PivotPoints(self.yesterday_data)
-        self.pivot_data = pp.calculate()
+        if self.computed_version == self.data_version:
+            self.skipped_computations += len(self.indicators)
+            return self.indicators
+
+        self.indicators = {}
+        for IndicatorClass, params in self.indicator_specs():
+            # Indicators keep their outputs to themselves, self.data is never widened
+            with metrics.stage(f'indicator.{IndicatorClass.__name__}.calculate'):
+                if IndicatorClass is PivotPoints:
+                    indicator = IndicatorClass(self.yesterday_data, **params)
+                    self.pivot_levels = indicator.calculate()
+                else:
+                    indicator = IndicatorClass(self.data, **params)
+                    indicator.calculate()
+            self.indicators[IndicatorClass.__name__] = indicator
+
+        self.scores = {}
+        for name, indicator in self.indicators.items():
+            with metrics.stage(f'indicator.{name}.analyze'):
+                self.scores[name] = indicator.analyze()
+        self.computed_version = self.data_version
+        return self.indicators
 
     def advice(self):
         self.calculate_indicators()
         
-        ma_score = MovingAverage(self.data, self.short_window, self.long_window).analyze()
-        rsi_score = RSI(self.data, self.rsi_window).analyze()
-        macd_score = MACD(self.data, self.macd_short, self.macd_long, self.macd_signal).analyze()
-        bb_score = BollingerBands(self.data, 20).analyze()
-        so_score = StochasticOscillator(self.data, 14).analyze()
-        pivot_score = PivotPoints(self.pivot_data).analyze()
-        
-        final_score = self.aggregate_scores(ma_score, rsi_score, macd_score, bb_score, so_score, pivot_score)
+        final_score = self.aggregate_scores(
+            self.scores['MovingAverage'],
+            self.scores['RSI'],
+            self.scores['MACD'],
+            self.scores['BollingerBands'],
+            self.scores['StochasticOscillator'],
+            self.scores['PivotPoints'],
+        )
         return final_score
 
-    def aggregate_scores(self, ma_score, rsi_score, macd_score, bb_score, so_score, pivot_score):
-        # Define weights for each indicator
-        weights = {
-            'ma': 1,
-            'rsi': 1,
-            'macd': 2,
-            'bb': 1,
-            'so': 0.5,
-            'pivot': 3
-        }
+    @staticmethod
+    def aggregate_scores(ma_score, rsi_score, macd_score, bb_score, so_score, pivot_score, weights=None):
+        weights = weights or Strategist.WEIGHTS
         
         # Calculate the weighted average score
         total_weight = sum(weights.values())
@@ -99,89 +149,32 @@ class Strategist:
         average_score = weighted_sum / total_weight
         return average_score
 
+    @metrics.timed('strategist.generate_pdf_report')
     def generate_pdf_report(self, general_advice):
         report_dir = os.path.join('reports', self.ticker)
         os.makedirs(report_dir, exist_ok=True)
         pdf_path = os.path.join(report_dir, f'{self.ticker}_strategy_report_{self.term}.pdf')
-        recommendations = []
+        self.calculate_indicators()
+        recommendations = [
+            (name, self.scores[name], self.get_current_indicator_value(indicator))
+            for name, indicator in self.indicators.items()
+        ]
         
-        with PdfPages(pdf_path) as pdf:
-            # Create recommendations table first
-            for IndicatorClass, params in [
-                (RSI, {'window': self.rsi_window}),
-                (BollingerBands, {'window': 20}),
-                (PivotPoints, {}),
-                (MACD, {'short_span': self.macd_short, 'long_span': self.macd_long, 'signal_span': self.macd_signal}),
-                (MovingAverage, {'short_window': self.short_window, 'long_window': self.long_window}),
-                (StochasticOscillator, {'window': 14})
-            ]:
-                indicator = IndicatorClass(self.data, **params)
-                indicator.calculate()
-                score = indicator.analyze()
-                current_value = self.get_current_indicator_value(indicator)
-                recommendations.append((indicator.__class__.__name__, score, current_value))
-            
-            self.add_recommendations_table(pdf, recommendations)
-            
-            # Plot general advice prominently
-            fig, ax = plt.subplots(figsize=(10, 2))
-            ax.text(0.5, 0.5, f'General Advice: {general_advice}', fontsize=24, ha='center', va='center', fontweight='bold', color='blue')
-            ax.axis('off')
-            pdf.savefig(fig)
-            plt.close(fig)
-            
-            # Plot strategies with charts
-            for IndicatorClass, params in [
-                (RSI, {'window': self.rsi_window}),
-                (BollingerBands, {'window': 20}),
-                (PivotPoints, {}),
-                (MACD, {'short_span': self.macd_short, 'long_span': self.macd_long, 'signal_span': self.macd_signal}),
-                (MovingAverage, {'short_window': self.short_window, 'long_window': self.long_window}),
-                (StochasticOscillator, {'window': 14})
-            ]:
-                indicator = IndicatorClass(self.data, **params)
-                indicator.calculate()
-                plt.figure(figsize=(10, 5))
-                indicator.plot()
-                pdf.savefig()
-                plt.close()
-                
-            self.add_pivot_points_table(pdf)  # Add pivot points after strategy plots
+        # The renderer brings matplotlib's PDF backend, only report processes import it
+        from report_renderer import get_renderer
+        get_renderer().render(pdf_path, general_advice, recommendations, self.indicators.values(), self.pivot_levels)
 
     def get_current_indicator_value(self, indicator):
         if isinstance(indicator, RSI):
-            return self.data['RSI'].iloc[-1]
+            return indicator.output.last('RSI')
         elif isinstance(indicator, BollingerBands):
             return self.data['Close'].iloc[-1]
         elif isinstance(indicator, PivotPoints):
-            return self.pivot_data['Pivot'].iloc[-1]
+            return self.pivot_levels.pivot
         elif isinstance(indicator, MACD):
-            return self.data['MACD'].iloc[-1]
+            return indicator.output.last('MACD')
         elif isinstance(indicator, MovingAverage):
             return self.data['Close'].iloc[-1]
         elif isinstance(indicator, StochasticOscillator):
-            return self.data['%K'].iloc[-1]
+            return indicator.output.last('%K')
         return 0.0
-
-    def add_recommendations_table(self, pdf, recommendations):
-        fig, ax = plt.subplots(figsize=(10, 2))
-        ax.axis('tight')
-        ax.axis('off')
-        table = ax.table(cellText=recommendations, colLabels=['Strategy', 'Score', 'Current Value'], cellLoc='center', loc='center')
-        table.auto_set_font_size(False)
-        table.set_fontsize(10)
-        table.auto_set_column_width(col=list(range(len(recommendations[0]))))
-        pdf.savefig()
-        plt.close()
-
-    def add_pivot_points_table(self, pdf):
-        pivot_points = self.pivot_data[['Pivot', 'R1', 'R2', 'R3', 'S1', 'S2', 'S3']].iloc[-1]
-        fig, ax = plt.subplots(figsize=(10, 2))
-        ax.axis('tight')
-        ax.axis('off')
-        table = ax.table(cellText=[pivot_points.values], colLabels=pivot_points.index, cellLoc='center', loc='center')
-        table.auto_set_font_size(False)
-        table.set_fontsize(10)
-        table.auto_set_column_width(col=list(range(len(pivot_points))))
-        pdf.savefig()
-        plt.close()
@@ -0,0 +1,186 @@
+import copy
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from bar_store import BAR_DTYPE, COLUMNS
+from market_data import YFinanceProvider
+from strategist import Strategist
+from indicators.pivot_points import PivotPoints
+from indicators.streaming import (
+    StreamingMovingAverage, StreamingRSI, StreamingMACD, StreamingBollingerBands, StreamingStochasticOscillator,
+)
+
+
+class BarRing:
+    # Fixed-size ring of the most recent bars, oldest overwritten first
+    def __init__(self, capacity):
+        self.records = np.zeros(capacity, dtype=BAR_DTYPE)
+        self.capacity = capacity
+        self.count = 0
+
+    def extend(self, timestamps, frame):
+        # Only the last `capacity` rows can survive, so only those are written
+        keep = min(len(frame), self.capacity)
+        positions = (self.count + len(frame) - keep + np.arange(keep)) % self.capacity
+        self.records['ts'][positions] = timestamps[len(frame) - keep:]
+        for column in COLUMNS:
+            self.records[column][positions] = frame[column].to_numpy(dtype=float)[len(frame) - keep:] if column in frame else np.nan
+        self.count += len(frame)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def ordered(self):
+        if self.count <= self.capacity:
+            return self.records[:self.count].copy()
+        head = self.count % self.capacity
+        return np.concatenate([self.records[head:], self.records[:head]])
+
+
+class StreamingScores:
+    # Streaming versions of Strategist's indicators for one session. Terms whose period is '1d'
+    # only look at the current session, so their state starts over when the bar date changes.
+    def __init__(self, short_window, long_window, rsi_window, macd_short, macd_long, macd_signal, per_session):
+        self.windows = (short_window, long_window, rsi_window, macd_short, macd_long, macd_signal)
+        self.per_session = per_session
+        self.session = None
+        self.reset()
+
+    def reset(self):
+        short_window, long_window, rsi_window, macd_short, macd_long, macd_signal = self.windows
+        self.indicators = {
+            'MovingAverage': StreamingMovingAverage(short_window, long_window),
+            'RSI': StreamingRSI(rsi_window),
+            'MACD': StreamingMACD(macd_short, macd_long, macd_signal),
+            'BollingerBands': StreamingBollingerBands(20),
+            'StochasticOscillator': StreamingStochasticOscillator(14),
+        }
+
+    def update(self, bar, session):
+        if self.per_session and session != self.session:
+            self.reset()
+        self.session = session
+        for indicator in self.indicators.values():
+            indicator.update(bar)
+
+    def scores(self):
+        return {name: indicator.analyze() for name, indicator in self.indicators.items()}
+
+
+class StrategistService:
+    # Long-lived replacement for building a Strategist every cycle: the first update() loads the
+    # term's history once, later ones only ingest bars newer than the last one seen. Indicator state
+    # is streamed, pivot points are recomputed when the clock's date rolls over, and advice() just
+    # returns the score of the last update. Terms with longer periods ('1mo', '1y') rebuild their
+    # state over the window whenever a new bar moves it, so they score exactly like a Strategist too.
+    #
+    # The newest bar may still be forming (the bar store rewrites it on the next fetch), so it is
+    # never folded into the streaming state: it is scored on a copy instead.
+    def __init__(self, ticker, term='short', pivot_type='Traditional', bar_store=None, market_data=None, capacity=None):
+        self.ticker = ticker
+        self.term = term
+        self.pivot_type = pivot_type
+        self.bar_store = bar_store
+        if market_data is None:
+            market_data = bar_store.market_data if bar_store is not None else YFinanceProvider()
+        self.market_data = market_data
+
+        if term not in Strategist.TERMS:
+            raise ValueError("Term must be 'very_short', 'short', 'medium', or 'long'")
+        self.period, self.interval, *windows = Strategist.TERMS[term]
+        short_window, long_window, rsi_window = windows[:3]
+        # Enough bars for the longest rolling window: long MA, RSI (plus the diff), Bollinger, %K and %D
+        self.ring = BarRing(capacity or max(long_window, rsi_window + 1, 20, 14 + 2))
+
+        self.state = StreamingScores(*windows, per_session=self.period == '1d')
+        self.last_ts = None  # Last bar folded into self.state
+        self.pivot_date = None
+        self.pivot_levels = None
+        self.pivot_score = None
+        self.indicator_scores = {}
+        self.score = None
+        self.ingested = 0
+
+    def fetch(self):
+        # Bars since the last folded one (the provisional bar included), or the term's history at first
+        if self.bar_store is not None:
+            if self.last_ts is None:
+                return self.bar_store.history(self.ticker, self.period, self.interval)
+            self.bar_store.update(self.ticker, self.interval, self.period)
+            return self.bar_store.range(self.ticker, self.interval, start=pd.Timestamp(self.last_ts + 1, tz='UTC'))
+        if self.last_ts is None:
+            return self.market_data.history(self.ticker, period=self.period, interval=self.interval)
+        return self.market_data.history(self.ticker, interval=self.interval, start=pd.Timestamp(self.last_ts + 1, tz='UTC'))
+
+    def yesterday_data(self, yesterday):
+        if self.bar_store is not None:
+            # Terms on coarser intervals are the only reason minute bars are fetched, like Strategist does
+            self.bar_store.update(self.ticker, '1m', '1d')
+            return self.bar_store.day(self.ticker, '1m', yesterday)
+        last_5_days = self.market_data.history(self.ticker, period='5d', interval='1m').sort_index()
+        return last_5_days[last_5_days.index.date == yesterday]
+
+    def update_pivots(self):
+        today = self.market_data.now().date()
+        if today == self.pivot_date:
+            return
+        yesterday = today - timedelta(days=1)
+        pivot_points = PivotPoints(self.yesterday_data(yesterday))
+        self.pivot_levels = pivot_points.calculate()
+        self.pivot_score = pivot_points.analyze()
+        self.pivot_date = today
+
+    @metrics.timed('strategist.update')
+    def update(self):
+        with metrics.stage('strategist.fetch'):
+            frame = self.fetch()
+            if not self.state.per_session and self.last_ts is not None and len(frame) > 1:
+                # A new bar moves the start of the term's window, where a fresh Strategist seeds its
+                # MACD EWMs: the state is rebuilt over the new window, once per hour or day
+                self.last_ts = None
+                self.state.reset()
+                frame = self.fetch()
+        self.update_pivots()
+
+        timestamps = frame.index.tz_convert('UTC').as_unit('ns').asi8
+        sessions = frame.index.date
+        closes, highs, lows = (frame[column].to_numpy(dtype=float).tolist() for column in ('Close', 'High', 'Low'))
+        completed = len(frame) - 1
+        for i in range(completed):
+            self.state.update({'Close': closes[i], 'High': highs[i], 'Low': lows[i]}, sessions[i])
+        if completed > 0:
+            self.ring.extend(timestamps[:completed], frame.iloc[:completed])
+            self.last_ts = int(timestamps[completed - 1])
+            self.ingested += completed
+
+        # The newest bar is scored on a copy, so a later revision of it can replace it cleanly
+        live = copy.deepcopy(self.state)
+        if len(frame):
+            live.update({'Close': closes[-1], 'High': highs[-1], 'Low': lows[-1]}, sessions[-1])
+        self.indicator_scores = live.scores()
+        self.indicator_scores['PivotPoints'] = self.pivot_score
+        self.score = self.aggregate(self.indicator_scores)
+        return self.score
+
+    @staticmethod
+    def aggregate(scores):
+        return Strategist.aggregate_scores(
+            scores['MovingAverage'],
+            scores['RSI'],
+            scores['MACD'],
+            scores['BollingerBands'],
+            scores['StochasticOscillator'],
+            scores['PivotPoints'],
+        )
+
+    def advice(self):
+        if self.score is None:
+            return self.update()
+        return self.score
+
+    def snapshot(self):
+        # A full Strategist for the PDF report, built from the local store only when a report is due
+        return Strategist(self.ticker, self.term, self.pivot_type, bar_store=self.bar_store, market_data=self.market_data)
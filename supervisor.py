@@ -0,0 +1,285 @@
+import argparse
+import math
+import multiprocessing
+import os
+import queue
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from termcolor import colored
+
+from watchlist import tickers as watchlist_tickers
+
+# Runs the trading loop of main.py for large watchlists: the watchlist is sharded by ticker hash over
+# worker processes, each fetching, scoring and signalling its own tickers, and a single writer process
+# owns the SQLite book and executes the orders the workers send it over a queue. Workers never touch
+# the database, so adding one adds scoring capacity without adding write contention.
+#
+# A worker scores a large shard with one vectorized Panel pass per cycle, and a small one with a
+# StrategistService per ticker like main.py: the panel rescans the session every cycle, which only
+# pays off once it spares enough per-ticker work (--scoring forces either).
+#
+#     python supervisor.py --shards 4
+#     REPLAY_DIR=recorded SHARDS=4 python supervisor.py
+#
+# The writer waits for every shard each cycle, but never past the cycle's deadline: a slow or dead
+# worker only leaves its tickers out of that cycle. Processes that exit or stop sending heartbeats
+# are restarted by the supervisor. Orders carry a client id per ticker and minute, so a restarted
+# writer or a re-sent order never trades twice. A writer that falls behind skips ahead instead of
+# catching up: it only trades on the newest message of each shard, and never on a stale minute.
+
+FETCH_THREADS = 16  # Per worker, for the bar fetches of its shard
+PANEL_TICKERS = 40  # Shards of at least this many tickers are scored with a Panel; ~35 broke even on the short term
+STALL_CYCLES = 20  # A process silent for this many cycles (and at least STALL_SECONDS) is restarted
+STALL_SECONDS = 30
+STARTUP_SECONDS = 120  # Grace period for a new process to load its bars before its first heartbeat
+
+
+def shard_of(ticker, shards):
+    # crc32 rather than hash(), which is salted per process
+    return zlib.crc32(ticker.encode()) % shards
+
+
+def shard_tickers(tickers, shards):
+    shards_tickers = [[] for _ in range(shards)]
+    for ticker in tickers:
+        shards_tickers[shard_of(ticker, shards)].append(ticker)
+    return shards_tickers
+
+
+def market_data_for(settings):
+    from market_data import YFinanceProvider, ReplayProvider
+    if not settings['replay_dir']:
+        return YFinanceProvider()
+    market_data = ReplayProvider(settings['replay_dir'], speed=settings['speed'], start=settings['start'])
+    # Every process runs on the supervisor's replay clock; time.monotonic() is system-wide
+    market_data.wall_start = settings['wall_start']
+    return market_data
+
+
+def sleep_until_next(next_start, cycle_seconds):
+    # Fixed cadence as in main.run_loop: slots that already passed are skipped
+    next_start += cycle_seconds
+    now = time.monotonic()
+    if now > next_start:
+        next_start += (int((now - next_start) // cycle_seconds) + 1) * cycle_seconds
+    time.sleep(next_start - now)
+    return next_start
+
+
+def run_worker(shard, tickers, settings, outbox, heartbeats):
+    # Scores the shard's tickers every cycle and sends (shard, scores, orders) to the writer
+    from bar_store import BarStore
+    from panel import PanelService
+    from signals import signal_for
+    from strategist_service import StrategistService
+
+    try:
+        market_data = market_data_for(settings)
+        bar_store = BarStore(settings['bars'], refresh_interval=settings['cycle_seconds'] / 2, market_data=market_data)
+        use_panel = settings['scoring'] == 'panel' or (settings['scoring'] == 'auto' and len(tickers) >= PANEL_TICKERS)
+        if use_panel:
+            panel = PanelService(tickers, settings['term'], bar_store)
+            step = panel.fetch
+        else:
+            services = {ticker: StrategistService(ticker, settings['term'], bar_store=bar_store) for ticker in tickers}
+            step = lambda ticker: services[ticker].update()
+
+        def update(ticker):
+            # One failing ticker only loses its own score (with a panel, its new bars)
+            try:
+                return step(ticker)
+            except Exception as e:
+                print(colored(f"Shard {shard}: {ticker} failed: {e!r}", 'red'))
+                return math.nan
+
+        with ThreadPoolExecutor(max_workers=min(len(tickers), FETCH_THREADS)) as executor:
+            next_start = time.monotonic()
+            while True:
+                if use_panel:
+                    # The fetches run concurrently, then the shard is scored in one vectorized pass
+                    list(executor.map(update, tickers))
+                    scores = panel.update()
+                else:
+                    scores = dict(zip(tickers, executor.map(update, tickers)))
+                minute = f"{market_data.now():%Y%m%d%H%M}"
+                orders = []
+                for ticker, score in scores.items():
+                    signal = signal_for(score)
+                    if signal is not None:
+                        side, leverage, fraction, _ = signal
+                        orders.append((f"{ticker}-{minute}", ticker, 'buy' if side > 0 else 'sell_short', fraction, leverage))
+                outbox.put((shard, scores, orders))
+                heartbeats[shard] = time.monotonic()
+                next_start = sleep_until_next(next_start, settings['cycle_seconds'])
+    except KeyboardInterrupt:
+        pass
+
+
+def run_writer(settings, inbox, shards, heartbeats, slot):
+    # Owns the database: each cycle gathers the shards' messages and executes their orders in one transaction
+    from order_queue import OrderQueue
+    from price_snapshot import PriceSnapshot
+    from signals import STOP_LOSS, TAKE_PROFIT
+    from trade_operations import TradeOperations
+
+    try:
+        market_data = market_data_for(settings)
+        operations = TradeOperations(settings['db_path'], PriceSnapshot(market_data, ttl=settings['cycle_seconds'] / 2))
+        orders = OrderQueue(operations)
+        cycle_seconds = settings['cycle_seconds']
+        next_start = time.monotonic()
+        while True:
+            heartbeats[slot] = time.monotonic()
+            deadline = next_start + cycle_seconds
+            latest = {}  # shard -> its newest (scores, orders)
+            superseded = 0
+            while latest.keys() < shards:
+                try:
+                    shard, shard_scores, shard_orders = inbox.get(timeout=max(deadline - time.monotonic(), 0.001))
+                except queue.Empty:
+                    break
+                superseded += shard in latest
+                latest[shard] = shard_scores, shard_orders
+            # A writer slower than the workers finds several messages per shard queued up: the inbox is
+            # emptied every cycle and only the newest message of each shard is used
+            while True:
+                try:
+                    shard, shard_scores, shard_orders = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                superseded += shard in latest
+                latest[shard] = shard_scores, shard_orders
+            if not latest:
+                # Nothing arrived in this slot: the workers are still loading their bars
+                next_start = time.monotonic()
+                continue
+
+            missing = sorted(shards - latest.keys())
+            if missing:
+                print(colored(f"Shards {missing} missed the cycle", 'red'))
+            # Orders whose client id minute is older than the previous one missed their cycle
+            oldest = f"{market_data.now() - timedelta(minutes=1):%Y%m%d%H%M}"
+            scores, stale = {}, 0
+            for shard_scores, shard_orders in latest.values():
+                scores.update(shard_scores)
+                for client_id, ticker, side, fraction, leverage in shard_orders:
+                    if client_id.rsplit('-', 1)[1] < oldest:
+                        stale += 1
+                        continue
+                    orders.submit(client_id, ticker, side, fraction=fraction, leverage=leverage,
+                                  stop_loss=STOP_LOSS, take_profit=TAKE_PROFIT)
+            if superseded or stale:
+                print(colored(f"Behind the workers: skipped {superseded} superseded message(s) and {stale} stale order(s)", 'red'))
+            with operations.transaction():
+                operations.refresh_prices(scores)
+                operations.check_portfolio_for_take_profit_or_stop_loss()
+                orders.execute()
+                operations.calculate_total_value()
+                operations.record_cycle(market_data.now(), scores)
+            print(f"{market_data.now():%Y-%m-%d %H:%M} {len(scores)} tickers from {len(latest)}/{len(shards)} shards, "
+                  f"P&L: {operations.ledger.summary()}, orders: {orders.stats()}")
+            next_start = max(next_start + cycle_seconds, time.monotonic())
+    except KeyboardInterrupt:
+        pass
+
+
+class Supervisor:
+    def __init__(self, tickers, shards, settings, stall_seconds=None):
+        self.context = multiprocessing.get_context('spawn')
+        self.settings = settings
+        self.shards = {shard: part for shard, part in enumerate(shard_tickers(tickers, shards)) if part}
+        self.writer_slot = shards
+        self.stall_seconds = stall_seconds or max(STALL_SECONDS, STALL_CYCLES * settings['cycle_seconds'])
+        self.inbox = self.context.Queue()
+        # Last heartbeat per shard plus the writer's, in time.monotonic() seconds
+        self.heartbeats = self.context.Array('d', shards + 1, lock=False)
+        self.processes = {}
+        self.restarts = 0
+
+    def spawn(self, slot):
+        if slot == self.writer_slot:
+            target, args = run_writer, (self.settings, self.inbox, set(self.shards), self.heartbeats, slot)
+        else:
+            target, args = run_worker, (slot, self.shards[slot], self.settings, self.inbox, self.heartbeats)
+        self.heartbeats[slot] = time.monotonic() + STARTUP_SECONDS
+        process = self.context.Process(target=target, args=args, name=f'shard-{slot}' if slot != self.writer_slot else 'writer', daemon=True)
+        process.start()
+        self.processes[slot] = process
+
+    def start(self):
+        for shard, tickers in self.shards.items():
+            print(f"Shard {shard}: {len(tickers)} tickers")
+        for slot in [self.writer_slot, *self.shards]:
+            self.spawn(slot)
+
+    def check(self):
+        # Restarts processes that died or stalled; the others keep running meanwhile
+        now = time.monotonic()
+        for slot, process in list(self.processes.items()):
+            stalled = now - self.heartbeats[slot] > self.stall_seconds
+            if process.is_alive() and not stalled:
+                continue
+            print(colored(f"{process.name} {'stalled' if process.is_alive() else f'exited ({process.exitcode})'}, restarting", 'red', attrs=['bold']))
+            self.terminate(process)
+            self.restarts += 1
+            self.spawn(slot)
+
+    @staticmethod
+    def terminate(process, timeout=5):
+        process.terminate()
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def run(self, poll=1):
+        self.start()
+        try:
+            while True:
+                time.sleep(poll)
+                self.check()
+        finally:
+            self.stop()
+
+    def stop(self):
+        for process in self.processes.values():
+            self.terminate(process)
+
+
+def main():
+    replay_dir = os.environ.get('REPLAY_DIR')
+    parser = argparse.ArgumentParser(description='Trade the watchlist with sharded worker processes and a single database writer')
+    parser.add_argument('--shards', type=int, default=int(os.environ.get('SHARDS', os.cpu_count() or 1)))
+    parser.add_argument('--replay', default=replay_dir, help='directory of recorded bars to use instead of yfinance')
+    parser.add_argument('--speed', type=float, default=float(os.environ.get('REPLAY_SPEED', 1000)))
+    parser.add_argument('--start', default=os.environ.get('REPLAY_START'))
+    parser.add_argument('--term', default='short')
+    parser.add_argument('--scoring', choices=('auto', 'panel', 'streaming'), default=os.environ.get('SCORING', 'auto'),
+                        help="score each shard with one Panel per cycle, or with a StrategistService per ticker")
+    args = parser.parse_args()
+
+    time_scale = args.speed if args.replay else 1
+    settings = {
+        'replay_dir': args.replay,
+        'speed': args.speed,
+        'start': args.start,
+        'wall_start': time.monotonic(),
+        'cycle_seconds': 60 / time_scale,
+        # Same files as main.py, which must not run against them at the same time
+        'db_path': './replay.db' if args.replay else './your_db_path.db',
+        'bars': './replay_bars' if args.replay else './bars',
+        'term': args.term,
+        'scoring': args.scoring,
+    }
+    supervisor = Supervisor(watchlist_tickers, args.shards, settings)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        print(f"Stopped after {supervisor.restarts} restart(s)")
+
+
+if __name__ == '__main__':
+    main()
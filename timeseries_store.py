@@ -0,0 +1,95 @@
+# Rollup resolutions in seconds; a bucket is the epoch second its interval starts at
+RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+
+def epoch(value):
+    # Integer epoch seconds (UTC) of an int, datetime, Timestamp or date string. Market clocks
+    # (market_data's now()) are aware UTC; a naive value is taken to be UTC too, never local time
+    if value is None or isinstance(value, (int, float)):
+        return value if value is None else int(value)
+    import pandas as pd  # Loaded with the first timestamp, not when trade_operations is imported
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize('UTC')
+    return int(timestamp.timestamp())
+
+
+class TimeSeriesStore:
+    # Per-cycle snapshots in SQLite with integer epoch-second keys. Tables are clustered on their
+    # primary keys (ts for the portfolio, (ticker, ts) for tickers), so a time range is one
+    # contiguous b-tree scan that never touches another index or the table twice. Every snapshot
+    # is also folded into 1m/1h/1d rollups with upserts, so long ranges are read pre-aggregated:
+    # a month is about 720 hourly rows instead of 43,200 minutes.
+    #
+    # The tables are created by TradeOperations.migrate; a timestamp already stored is ignored,
+    # so re-recording a cycle never counts it twice in the rollups.
+    def __init__(self, cur):
+        self.cur = cur
+
+    def record(self, ts, total_value, budget, realized, unrealized, exposure, tickers=()):
+        # tickers: (ticker, price, exposure, unrealized, score) rows; price and score may be None (a
+        # bucket's rollup then keeps its last known price), a NaN score (indicators still warming up)
+        # is stored as None too, SQLite would turn it into NULL anyway
+        ts = epoch(ts)
+        self.cur.execute('''INSERT OR IGNORE INTO cycle_snapshots (ts, total_value, budget, realized, unrealized, exposure)
+                            VALUES (?, ?, ?, ?, ?, ?)''', (ts, total_value, budget, realized, unrealized, exposure))
+        if not self.cur.rowcount:
+            return False
+        tickers = [(ticker, ts, price, exposure, unrealized, None if score is None or score != score else score)
+                   for ticker, price, exposure, unrealized, score in tickers]
+        self.cur.executemany('''INSERT INTO ticker_snapshots (ticker, ts, price, exposure, unrealized, score)
+                                VALUES (?, ?, ?, ?, ?, ?)''', tickers)
+        self.roll_up([(ts, total_value)], tickers)
+        return True
+
+    def roll_up(self, equity, tickers):
+        # Folds (ts, total_value) and ticker snapshot rows, oldest first, into every resolution
+        self.cur.executemany('''INSERT INTO equity_rollups (resolution, bucket, open, high, low, close, samples)
+                                VALUES (?, ?, ?, ?, ?, ?, 1)
+                                ON CONFLICT (resolution, bucket) DO UPDATE SET
+                                high=max(high, excluded.high), low=min(low, excluded.low), close=excluded.close, samples=samples + 1''',
+                             [(seconds, ts - ts % seconds, value, value, value, value)
+                              for ts, value in equity for seconds in RESOLUTIONS.values()])
+        self.cur.executemany('''INSERT INTO ticker_rollups (resolution, ticker, bucket, price, exposure, unrealized, score_sum, scores, samples)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+                                ON CONFLICT (resolution, ticker, bucket) DO UPDATE SET
+                                price=coalesce(excluded.price, price), exposure=excluded.exposure, unrealized=excluded.unrealized,
+                                score_sum=score_sum + excluded.score_sum, scores=scores + excluded.scores, samples=samples + 1''',
+                             [(seconds, ticker, ts - ts % seconds, price, exposure, unrealized, score or 0.0, int(score is not None))
+                              for ticker, ts, price, exposure, unrealized, score in tickers for seconds in RESOLUTIONS.values()])
+
+    def rebuild_rollups(self):
+        # Recomputes every rollup from the raw snapshots, e.g. after importing history
+        self.cur.execute('''DELETE FROM equity_rollups''')
+        self.cur.execute('''DELETE FROM ticker_rollups''')
+        equity = self.cur.execute('''SELECT ts, total_value FROM cycle_snapshots ORDER BY ts''').fetchall()
+        tickers = self.cur.execute('''SELECT ticker, ts, price, exposure, unrealized, score FROM ticker_snapshots ORDER BY ts''').fetchall()
+        self.roll_up(equity, tickers)
+
+    def equity(self, start=None, end=None, resolution=None):
+        # Raw snapshots (ts, total_value, budget, realized, unrealized, exposure), or with a resolution
+        # (bucket, open, high, low, close, samples) rollups; start and end are inclusive
+        start, end = epoch(start) or 0, epoch(end) or 2 ** 62
+        if resolution is None:
+            return self.cur.execute('''SELECT ts, total_value, budget, realized, unrealized, exposure FROM cycle_snapshots
+                                       WHERE ts BETWEEN ? AND ? ORDER BY ts''', (start, end)).fetchall()
+        seconds = RESOLUTIONS[resolution]
+        return self.cur.execute('''SELECT bucket, open, high, low, close, samples FROM equity_rollups
+                                   WHERE resolution=? AND bucket BETWEEN ? AND ? ORDER BY bucket''',
+                                (seconds, start - start % seconds, end)).fetchall()
+
+    def ticker(self, ticker, start=None, end=None, resolution=None):
+        # Raw (ts, price, exposure, unrealized, score) rows, or with a resolution
+        # (bucket, price, exposure, unrealized, mean score, samples) taken at the end of each bucket
+        start, end = epoch(start) or 0, epoch(end) or 2 ** 62
+        if resolution is None:
+            return self.cur.execute('''SELECT ts, price, exposure, unrealized, score FROM ticker_snapshots
+                                       WHERE ticker=? AND ts BETWEEN ? AND ? ORDER BY ts''', (ticker, start, end)).fetchall()
+        seconds = RESOLUTIONS[resolution]
+        return self.cur.execute('''SELECT bucket, price, exposure, unrealized, score_sum / NULLIF(scores, 0), samples FROM ticker_rollups
+                                   WHERE resolution=? AND ticker=? AND bucket BETWEEN ? AND ? ORDER BY bucket''',
+                                (seconds, ticker, start - start % seconds, end)).fetchall()
+
+    def latest(self):
+        return self.cur.execute('''SELECT ts, total_value, budget, realized, unrealized, exposure FROM cycle_snapshots
+                                   ORDER BY ts DESC LIMIT 1''').fetchone()
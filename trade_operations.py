@@ -1,23 +1,35 @@
 import sqlite3
-import yfinance as yf
+import numpy as np
+from contextlib import contextmanager
 from datetime import datetime
 from termcolor import colored
 from prettytable import PrettyTable
-import pdb
 
-companies = [
-    {'ticker': 'BTC-EUR', 'color': 'yellow'},
-    {'ticker': 'ETH-EUR', 'color': 'light_magenta'},
-    {'ticker': 'SOL-EUR', 'color': 'light_cyan'},
-    {'ticker': 'DOGE-EUR', 'color': 'dark_grey'},
-    {'ticker': 'LTC-EUR', 'color': 'white'}
-]
+import metrics
+from price_snapshot import PriceSnapshot
+from position_book import PositionBook
+from pnl_ledger import PnLLedger
+from timeseries_store import TimeSeriesStore
+from watchlist import colors
+
+SCHEMA_VERSION = 5
 
 class TradeOperations:
-    def __init__(self, db_path):
+    def __init__(self, db_path, prices=None):
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
+        self.prices = prices or PriceSnapshot()
+        # Mark-to-market of the book, see pnl_ledger
+        self.ledger = PnLLedger()
+        # Identical SQL text is prepared once and reused from the statement cache
+        self.conn = sqlite3.connect(db_path, cached_statements=256)
         self.cur = self.conn.cursor()
+        # Cycle snapshots and their rollups, see record_cycle
+        self.history = TimeSeriesStore(self.cur)
+        self.cur.execute('''PRAGMA journal_mode=WAL''')
+        self.cur.execute('''PRAGMA synchronous=NORMAL''')
+        # Writes are committed once per transaction() block, transaction rows are inserted in one batch
+        self.transaction_depth = 0
+        self.pending_transactions = []
         self.cur.execute('''CREATE TABLE IF NOT EXISTS portfolio (
                             id INTEGER PRIMARY KEY AUTOINCREMENT,
                             ticker TEXT, 
@@ -43,7 +55,9 @@ class TradeOperations:
                             quantity INTEGER,
                             leverage REAL,
                             stop_loss REAL,
-                            take_profit REAL)''')
+                            take_profit REAL,
+                            entry_price REAL)''')
+        self.migrate()
         self.conn.commit()
         
         # Initialize budget if empty
@@ -52,65 +66,65 @@ class TradeOperations:
             self.cur.execute('''INSERT INTO budget (id, amount) VALUES (1, 100000)''')
             self.conn.commit()
 
+        # Budget and open positions are mirrored in memory, and reloaded by transaction() when
+        # another connection (e.g. sell_everything.py) has committed in the meantime
+        self.load_book()
+
+    @metrics.timed('db.buy')
     def buy(self, ticker, quantity, stop_loss, take_profit, leverage):
-        stock = yf.Ticker(ticker).history(period='1d', interval='1m')
-        price = stock['Close'].iloc[-1]
+        price = self.prices.get(ticker)
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        self.cur.execute('''SELECT amount FROM budget WHERE id=1''')
-        budget = self.cur.fetchone()[0]
+        budget = self.budget
 
         total_cost = price * quantity
         if total_cost <= budget:
             budget -= total_cost
-            self.cur.execute('''UPDATE budget SET amount=? WHERE id=1''', (budget,))
+            self.adjust_budget(-total_cost)
             
             self.cur.execute('''INSERT INTO portfolio 
                                 (ticker, quantity, bought_price, stop_loss, take_profit, leverage) 
                                 VALUES (?, ?, ?, ?, ?, ?)''', (ticker, quantity, price, stop_loss, take_profit, leverage))
+            self.book.add('long', (self.cur.lastrowid, ticker, quantity, price, stop_loss, take_profit, leverage))
+            self.ledger.open('long', self.book.positions['long'][self.cur.lastrowid])
             
             # Record the transaction
-            self.cur.execute('''INSERT INTO transactions 
-                                (ticker, quantity, price, transaction_type, timestamp, leverage) 
-                                VALUES (?, ?, ?, 'buy', ?, ?)''', (ticker, quantity, price, timestamp, leverage))
-            self.conn.commit()
+            self.record_transaction(ticker, quantity, price, 'buy', timestamp, leverage)
+            self.commit()
             print(colored(f"Bought {quantity} shares of {ticker} at {price} each on {timestamp}. Remaining budget: ${budget}.", 'light_green'))
 
         else:
             print("Insufficient funds for this purchase.")
 
+    @metrics.timed('db.sell')
     def sell(self, ticker, quantity):
-        self.cur.execute('''SELECT quantity, leverage, bought_price FROM portfolio WHERE ticker=? AND quantity=?''', (ticker, quantity))
-        result = self.cur.fetchone()
+        result = self.book.find('long', ticker, quantity)
 
-        if result and result[0] >= quantity:
-            stock = yf.Ticker(ticker).history(period='1d', interval='1m')
-            price = stock['Close'].iloc[-1]
+        if result:
+            price = self.prices.get(ticker)
             timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            leverage = result[1]
-            bought_price = result[2]
+            position_id, _, _, bought_price, _, _, leverage = result
 
             gain = (price - bought_price) * quantity * leverage
             total_revenue = bought_price * quantity + gain
-            self.cur.execute('''UPDATE portfolio SET quantity=quantity - ? WHERE ticker=? AND quantity=?''', (quantity, ticker, quantity))
-            self.cur.execute('''DELETE FROM portfolio WHERE quantity=0''')
+            if not self.delete_positions('long', [position_id]):
+                return
+            self.ledger.close('long', self.book.remove('long', position_id), price)
             
-            self.cur.execute('''UPDATE budget SET amount=amount + ? WHERE id=1''', (total_revenue,))
+            self.adjust_budget(total_revenue)
             
             # Record the transaction
-            self.cur.execute('''INSERT INTO transactions 
-                                (ticker, quantity, price, transaction_type, timestamp, leverage) 
-                                VALUES (?, ?, ?, 'sell', ?, ?)''', (ticker, quantity, price, timestamp, leverage))
-            self.conn.commit()
+            self.record_transaction(ticker, quantity, price, 'sell', timestamp, leverage)
+            self.commit()
 
-            print(colored(f"Sold {quantity} shares of {ticker} at {price} on {timestamp}. Revenue: ${total_revenue}. Budget: ${self.cur.execute('''SELECT amount FROM budget WHERE id=1''').fetchone()[0]}.", 'light_red'))
+            print(colored(f"Sold {quantity} shares of {ticker} at {price} on {timestamp}. Revenue: ${total_revenue}. Budget: ${self.budget}.", 'light_red'))
 
         else:
             print("Not enough shares to sell.")
     
+    @metrics.timed('db.sell_short')
     def sell_short(self, ticker, quantity, leverage, stop_loss, take_profit):
-        stock = yf.Ticker(ticker).history(period='1d', interval='1m')
-        price = stock['Close'].iloc[-1]
+        price = self.prices.get(ticker)
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
         total_revenue = price * quantity
@@ -120,59 +134,90 @@ class TradeOperations:
         short_take_profit = price * (1 - take_profit)
 
         # Record the transaction
-        self.cur.execute('''INSERT INTO transactions 
-                            (ticker, quantity, price, transaction_type, timestamp, leverage) 
-                            VALUES (?, ?, ?, 'short', ?, ?)''', (ticker, quantity, price, timestamp, leverage))
+        self.record_transaction(ticker, quantity, price, 'short', timestamp, leverage)
         
-        self.cur.execute('''UPDATE budget SET amount=amount - ? WHERE id=1''', (total_revenue,))
-        
-        self.conn.commit()
+        self.adjust_budget(-total_revenue)
         
         self.cur.execute('''INSERT INTO short_positions 
-                            (ticker, quantity, leverage, stop_loss, take_profit) 
-                            VALUES (?, ?, ?, ?, ?)''', (ticker, quantity, leverage, short_stop_loss, short_take_profit))
+                            (ticker, quantity, leverage, stop_loss, take_profit, entry_price) 
+                            VALUES (?, ?, ?, ?, ?, ?)''', (ticker, quantity, leverage, short_stop_loss, short_take_profit, price))
+        self.book.add('short', (self.cur.lastrowid, ticker, quantity, price, short_stop_loss, short_take_profit, leverage))
+        self.ledger.open('short', self.book.positions['short'][self.cur.lastrowid])
 
-        self.conn.commit()
-        print(colored(f"Shorted {quantity} shares of {ticker} at {price} each on {timestamp}. Remaining budget: ${self.cur.execute('''SELECT amount FROM budget WHERE id=1''').fetchone()[0]}.", 'light_red'))
+        self.commit()
+        print(colored(f"Shorted {quantity} shares of {ticker} at {price} each on {timestamp}. Remaining budget: ${self.budget}.", 'light_red'))
 
+    @metrics.timed('db.buy_short')
     def buy_short(self, ticker, quantity):
-        self.cur.execute('''SELECT quantity, leverage FROM short_positions WHERE ticker=? AND quantity=?''', (ticker, quantity))
-        result = self.cur.fetchone()
+        result = self.book.find('short', ticker, quantity)
 
-        if result and result[0] >= quantity:
-            stock = yf.Ticker(ticker).history(period='1d', interval='1m')
-            price = stock['Close'].iloc[-1]
+        if result:
+            price = self.prices.get(ticker)
             timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            leverage = result[1]
+            position_id, _, _, sold_price, _, _, leverage = result
 
-            # Get the initial short price from transactions
-            sold_price = self.cur.execute('''SELECT price FROM transactions WHERE ticker=? AND transaction_type='short' AND quantity=? ORDER BY timestamp DESC LIMIT 1''', (ticker, quantity)).fetchone()[0]
             gain = (sold_price - price) * quantity * leverage
             total_cost = sold_price * quantity + gain
-            self.cur.execute('''UPDATE budget SET amount=amount + ? WHERE id=1''', (total_cost,))
-            self.cur.execute('''UPDATE short_positions SET quantity=quantity - ? WHERE ticker=? AND quantity=?''', (quantity, ticker, quantity))
-            self.cur.execute('''DELETE FROM short_positions WHERE quantity=0''')
+            if not self.delete_positions('short', [position_id]):
+                return
+            self.adjust_budget(total_cost)
+            self.ledger.close('short', self.book.remove('short', position_id), price)
             
             # Record the transaction
-            self.cur.execute('''INSERT INTO transactions 
-                                (ticker, quantity, price, transaction_type, timestamp, leverage) 
-                                VALUES (?, ?, ?, 'buy_short', ?, ?)''', (ticker, quantity, price, timestamp, leverage))
-            self.conn.commit()
+            self.record_transaction(ticker, quantity, price, 'buy_short', timestamp, leverage)
+            self.commit()
 
-            print(colored(f"Bought to cover {quantity} shares of {ticker} at {price} on {timestamp}. Total cost: ${total_cost}. Budget: ${self.cur.execute('''SELECT amount FROM budget WHERE id=1''').fetchone()[0]}.", 'light_red'))
+            print(colored(f"Bought to cover {quantity} shares of {ticker} at {price} on {timestamp}. Total cost: ${total_cost}. Budget: ${self.budget}.", 'light_red'))
 
         else:
             print("Not enough shares to cover.")
 
     def get_budget(self):
-        self.cur.execute('''SELECT amount FROM budget WHERE id=1''')
-        return self.cur.fetchone()[0]
+        return self.budget
+
+    def adjust_budget(self, amount):
+        # Relative update, so cash another connection added or spent in the meantime is kept
+        self.budget += amount
+        self.cur.execute('''UPDATE budget SET amount=amount + ? WHERE id=1''', (amount,))
+
+    def delete_positions(self, side, position_ids):
+        # Deletes book rows by id and returns the ids that were still in the table. A row already gone
+        # was closed by another connection, which credited it: it leaves the book without a credit,
+        # and the budget is re-read with that connection's changes.
+        table = 'portfolio' if side == 'long' else 'short_positions'
+        deleted = set()
+        for position_id in position_ids:
+            self.cur.execute(f'''DELETE FROM {table} WHERE id=?''', (position_id,))
+            if self.cur.rowcount:
+                deleted.add(position_id)
+            else:
+                row = self.book.remove(side, position_id)
+                self.ledger.apply(side, row, -1)
+                print(colored(f"{row[1]} position {position_id} was already closed elsewhere, skipped.", 'yellow'))
+        if len(deleted) < len(position_ids):
+            self.budget = self.cur.execute('''SELECT amount FROM budget WHERE id=1''').fetchone()[0]
+        return deleted
     
+    def open_positions(self):
+        # (id, ticker, quantity, entry_price, stop_loss, take_profit, leverage) rows, served from memory
+        return self.book.rows('long'), self.book.rows('short')
+
+    @metrics.timed('db.load_book')
+    def load_book(self):
+        self.data_version = self.cur.execute('''PRAGMA data_version''').fetchone()[0]
+        self.budget = self.cur.execute('''SELECT amount FROM budget WHERE id=1''').fetchone()[0]
+        # The whole book in one round trip: (side, id, ticker, quantity, entry_price, stop_loss, take_profit, leverage)
+        self.cur.execute('''SELECT 'long', id, ticker, quantity, bought_price, stop_loss, take_profit, leverage FROM portfolio
+                            UNION ALL
+                            SELECT 'short', id, ticker, quantity, entry_price, stop_loss, take_profit, leverage FROM short_positions''')
+        positions = self.cur.fetchall()
+        portfolio = [position[1:] for position in positions if position[0] == 'long']
+        short_positions = [position[1:] for position in positions if position[0] == 'short']
+        self.book = PositionBook(portfolio, short_positions)
+        self.ledger.load(self.book, self.cur.execute('''SELECT ticker, side, leverage, amount FROM realized_pnl''').fetchall())
+
     def print_portfolio(self):
-        self.cur.execute('''SELECT * FROM portfolio''')
-        portfolio = self.cur.fetchall()
-        self.cur.execute('''SELECT * FROM short_positions''')
-        short_positions = self.cur.fetchall()
+        portfolio, short_positions = self.open_positions()
 
         # Create tables
         table_portfolio = PrettyTable()
@@ -182,15 +227,14 @@ class TradeOperations:
         table_short_positions.field_names = ["Ticker", "Quantity", "Shorted Price", "Current Price", "Gain", "Stop-Loss", "Take-Profit", "Leverage"]
 
         for id, ticker, quantity, bought_price, stop_loss, take_profit, leverage in portfolio:
-            concerned_color = next((item['color'] for item in companies if item['ticker'] == ticker), 'white')
+            concerned_color = colors.get(ticker, 'white')
             current_price = self.get_current_price_one_unit(ticker)
             gain = (current_price - bought_price) * quantity * leverage
             table_portfolio.add_row([colored(ticker, concerned_color), quantity, bought_price, current_price, gain, stop_loss, take_profit, leverage])
 
-        for id, ticker, quantity, leverage, stop_loss, take_profit in short_positions:
-            concerned_color = next((item['color'] for item in companies if item['ticker'] == ticker), 'white')
+        for id, ticker, quantity, sold_price, stop_loss, take_profit, leverage in short_positions:
+            concerned_color = colors.get(ticker, 'white')
             current_price = self.get_current_price_one_unit(ticker)
-            sold_price = self.cur.execute('''SELECT price FROM transactions WHERE ticker=? AND transaction_type='short' AND quantity=? ORDER BY timestamp DESC LIMIT 1''', (ticker, quantity)).fetchone()[0]
             gain = (sold_price - current_price) * quantity * leverage
             table_short_positions.add_row([colored(ticker, concerned_color), quantity, sold_price, current_price, gain, stop_loss, take_profit, leverage])
 
@@ -199,93 +243,295 @@ class TradeOperations:
         print(colored("Short Positions:", 'red', attrs=['bold']))
         print(table_short_positions)
 
+    @metrics.timed('portfolio.risk_check')
     def check_portfolio_for_take_profit_or_stop_loss(self):
-        self.cur.execute('''SELECT * FROM portfolio''')
-        portfolio = self.cur.fetchall()
-        self.cur.execute('''SELECT * FROM short_positions''')
-        short_positions = self.cur.fetchall()
-
-        for id, ticker, quantity, bought_price, stop_loss, take_profit, leverage in portfolio:
-            current_price = self.get_current_price_one_unit(ticker)
-            if current_price >= take_profit or current_price <= stop_loss:
-                gain = (current_price - bought_price) * quantity * leverage
-                gain_percentage = (gain / (bought_price * quantity * leverage)) * 100
-                print(f"Conditions met for {ticker}: Current price {current_price:.2f}, Stop Loss {stop_loss:.2f}, Take Profit {take_profit:.2f}. Selling {quantity} shares.")
-                print(colored(f"Gain: {gain:.2f} ({gain_percentage:.2f}%) with Leverage: {leverage}", 'green' if gain > 0 else 'red'))
-                self.sell(ticker, quantity)
-
-        for id, ticker, quantity, leverage, stop_loss, take_profit in short_positions:
-            current_price = self.get_current_price_one_unit(ticker)
-            sold_price = self.cur.execute('''SELECT price FROM transactions WHERE ticker=? AND transaction_type='short' AND quantity=? ORDER BY timestamp DESC LIMIT 1''', (ticker, quantity)).fetchone()[0]
-            if current_price <= take_profit or current_price >= stop_loss:
-                gain = (sold_price - current_price) * quantity * leverage
-                gain_percentage = (gain / (sold_price * quantity * leverage)) * 100
-                print(f"Conditions met for {ticker} (short): Current price {current_price:.2f}, Stop Loss {stop_loss:.2f}, Take Profit {take_profit:.2f}. Buying to cover {quantity} shares.")
-                print(colored(f"Gain: {gain:.2f} ({gain_percentage:.2f}%) with Leverage: {leverage}", 'green' if gain > 0 else 'red'))
-                self.buy_short(ticker, quantity)
+        # Whole book at once: one price per ticker, trigger masks and gains as arrays, closes in one transaction
+        with self.transaction():
+            for side, rows in zip(PositionBook.SIDES, self.open_positions()):
+                if not rows:
+                    continue
+                columns = list(zip(*rows))
+                tickers = np.array(columns[1], dtype=object)
+                quantity, entry_price, stop_loss, take_profit, leverage = (np.array(column, dtype=float) for column in columns[2:])
+                unique_tickers, ticker_index = np.unique(tickers, return_inverse=True)
+                current_price = np.array([self.get_current_price_one_unit(ticker) for ticker in unique_tickers], dtype=float)[ticker_index]
+
+                if side == 'long':
+                    triggered = (current_price >= take_profit) | (current_price <= stop_loss)
+                    gain = (current_price - entry_price) * quantity * leverage
+                else:
+                    triggered = (current_price <= take_profit) | (current_price >= stop_loss)
+                    gain = (entry_price - current_price) * quantity * leverage
+                gain_percentage = gain / (entry_price * quantity * leverage) * 100
+
+                closing = np.flatnonzero(triggered)
+                for i in closing.tolist():
+                    if side == 'long':
+                        print(f"Conditions met for {tickers[i]}: Current price {current_price[i]:.2f}, Stop Loss {stop_loss[i]:.2f}, Take Profit {take_profit[i]:.2f}. Selling {rows[i][2]} shares.")
+                    else:
+                        print(f"Conditions met for {tickers[i]} (short): Current price {current_price[i]:.2f}, Stop Loss {stop_loss[i]:.2f}, Take Profit {take_profit[i]:.2f}. Buying to cover {rows[i][2]} shares.")
+                    print(colored(f"Gain: {gain[i]:.2f} ({gain_percentage[i]:.2f}%) with Leverage: {rows[i][6]}", 'green' if gain[i] > 0 else 'red'))
+                if len(closing):
+                    self.close_positions(side, [rows[i] for i in closing.tolist()], current_price[closing])
+
+    @metrics.timed('db.close_positions')
+    def close_positions(self, side, rows, prices):
+        # Closes book rows at the given prices with a single budget update; rows another connection
+        # already closed are skipped. Returns {position id: proceeds} of the rows closed here only.
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        deleted = self.delete_positions(side, [row[0] for row in rows])
+        if len(deleted) < len(rows):
+            closed = [i for i, row in enumerate(rows) if row[0] in deleted]
+            rows, prices = [rows[i] for i in closed], prices[closed]
+            if not rows:
+                return {}
+        position_ids, tickers, quantity, entry_price, _, _, leverage = zip(*rows)
+        quantity, entry_price, leverage = (np.array(column, dtype=float) for column in (quantity, entry_price, leverage))
+        proceeds = self.close_proceeds(side, entry_price, quantity, leverage, prices)
+
+        transaction_type = 'sell' if side == 'long' else 'buy_short'
+        for row, price in zip(rows, prices.tolist()):
+            self.ledger.close(side, self.book.remove(side, row[0]), price)
+            self.record_transaction(row[1], row[2], price, transaction_type, timestamp, row[6])
+        self.adjust_budget(float(proceeds.sum()))
+        self.commit()
+
+        for row, price, amount in zip(rows, prices.tolist(), proceeds.tolist()):
+            if side == 'long':
+                print(colored(f"Sold {row[2]} shares of {row[1]} at {price} on {timestamp}. Revenue: ${amount}.", 'light_red'))
+            else:
+                print(colored(f"Bought to cover {row[2]} shares of {row[1]} at {price} on {timestamp}. Total cost: ${amount}.", 'light_red'))
+        print(colored(f"Budget: ${self.budget}.", 'light_red'))
+        return dict(zip(position_ids, proceeds.tolist()))
+
+    @staticmethod
+    def close_proceeds(side, entry_price, quantity, leverage, price):
+        # Cash a close returns, for scalars or arrays: the entry notional plus the leveraged gain
+        direction = 1 if side == 'long' else -1
+        return entry_price * quantity + direction * (price - entry_price) * quantity * leverage
+
+    def allocate_ids(self, table, count):
+        # AUTOINCREMENT ids for rows inserted in bulk, executemany has no lastrowid per row
+        sequence = self.cur.execute('''SELECT seq FROM sqlite_sequence WHERE name=?''', (table,)).fetchone()
+        largest = self.cur.execute(f'''SELECT COALESCE(MAX(id), 0) FROM {table}''').fetchone()[0]
+        start = max(sequence[0] if sequence else 0, largest) + 1
+        return range(start, start + count)
+
+    @metrics.timed('db.add_positions')
+    def add_positions(self, side, rows):
+        # Opens (ticker, quantity, entry_price, stop_loss, take_profit, leverage) rows with one executemany;
+        # the budget is left to the caller
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        table = 'portfolio' if side == 'long' else 'short_positions'
+        rows = [(position_id,) + tuple(row) for position_id, row in zip(self.allocate_ids(table, len(rows)), rows)]
+        if side == 'long':
+            self.cur.executemany('''INSERT INTO portfolio
+                                    (id, ticker, quantity, bought_price, stop_loss, take_profit, leverage)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?)''', rows)
+        else:
+            self.cur.executemany('''INSERT INTO short_positions
+                                    (id, ticker, quantity, entry_price, stop_loss, take_profit, leverage)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?)''', rows)
+        transaction_type = 'buy' if side == 'long' else 'short'
+        for row in rows:
+            self.book.add(side, row)
+            self.ledger.open(side, row)
+            self.record_transaction(row[1], row[2], row[3], transaction_type, timestamp, row[6])
+        self.commit()
+        return rows
 
     def sell_full_ticker(self, ticker):
-        self.cur.execute('''SELECT quantity FROM portfolio WHERE ticker=?''', (ticker,))
-        quantity = self.cur.fetchone()[0]
+        quantity = self.book.find('long', ticker)[2]
         self.sell(ticker, quantity)
     
     def sell_everything(self):
-        self.cur.execute('''SELECT * FROM portfolio''')
-        portfolio = self.cur.fetchall()
-        for id, ticker, quantity, _, _, _, _ in portfolio:
-            self.sell(ticker, quantity)
-        self.cur.execute('''SELECT * FROM short_positions''')
-        short_positions = self.cur.fetchall()
-        for id, ticker, quantity, _, _, _ in short_positions:
-            self.buy_short(ticker, quantity)
+        portfolio, short_positions = self.open_positions()
+        if portfolio or short_positions:
+            # One quote fetch for every held ticker up front, instead of one per ticker as it is sold
+            self.refresh_prices()
+        with self.transaction():
+            for id, ticker, quantity, _, _, _, _ in portfolio:
+                self.sell(ticker, quantity)
+            for id, ticker, quantity, _, _, _, _ in short_positions:
+                self.buy_short(ticker, quantity)
     
     def sell_specific(self, ticker):
-        self.cur.execute('''SELECT quantity FROM portfolio WHERE ticker=?''', (ticker,))
-        result = self.cur.fetchone()
+        result = self.book.find('long', ticker)
         if result:
-            self.sell(ticker, result[0])
+            self.sell(ticker, result[2])
         else:
             print(f"No shares of {ticker} to sell.")
     
+    @metrics.timed('portfolio.valuation')
     def calculate_total_value(self):
-        # Fetch the current budget
-        self.cur.execute('''SELECT amount FROM budget WHERE id=1''')
-        budget = self.cur.fetchone()[0]
-
-        # Fetch all tickers and quantities from the portfolio
-        self.cur.execute('''SELECT ticker, quantity, bought_price, leverage FROM portfolio''')
-        portfolio = self.cur.fetchall()
-
-        # Fetch all tickers and quantities from the short positions
-        self.cur.execute('''SELECT ticker, quantity, leverage, stop_loss, take_profit FROM short_positions''')
-        short_positions = self.cur.fetchall()
-
-        total_value = budget
-        for ticker, quantity, bought_price, leverage in portfolio:
-            # Fetch the current price of each ticker
-            stock = yf.Ticker(ticker).history(period='1d', interval='1m')
-            price = stock['Close'].iloc[-1]
-
-            # Calculate the gain and add it to the total value
-            gain = (price - bought_price) * quantity
-            total_value += bought_price * quantity + leverage * gain
-
-        for ticker, quantity, leverage, stop_loss, take_profit in short_positions:
-            # Fetch the current price of each ticker
-            stock = yf.Ticker(ticker).history(period='1d', interval='1m')
-            price = stock['Close'].iloc[-1]
-
-            # Get the initial short price from transactions
-            sold_price = self.cur.execute('''SELECT price FROM transactions WHERE ticker=? AND transaction_type='short' ORDER BY timestamp DESC LIMIT 1''', (ticker,)).fetchone()[0]
-            gain = (sold_price - price) * quantity
-            total_value += leverage * gain + sold_price * quantity
+        # Held tickers are marked at their current price, the total comes from the ledger's running sum:
+        # the cost grows with the number of tickers, not positions
+        for ticker in self.ledger.tickers():
+            self.ledger.mark(ticker, self.prices.get(ticker))
+        total_value = self.ledger.total_value(self.budget)
 
         print(f"Total portfolio value plus budget: " + colored(total_value, 'cyan', attrs=['bold']))
         return total_value
-    
+
+    @metrics.timed('portfolio.snapshot')
+    def record_cycle(self, timestamp, scores=None):
+        # One time-series snapshot of the cycle at `timestamp` (market time): the valuation, and per
+        # ticker held or scored its price, exposure, unrealized P&L and score. The running total is
+        # resynced with an exact sum first. Prices are the cycle's cached quotes, never fetched here:
+        # a ticker without one (or a NaN score, from a ticker whose scoring failed) is stored as NULL.
+        scores = scores or {}
+        self.ledger.resync()
+        summary = self.ledger.summary()
+        held = {}
+        for ticker, _, _, _, _, _, unrealized, exposure, _ in self.ledger.positions():
+            totals = held.setdefault(ticker, [0.0, 0.0])
+            totals[0] += exposure
+            totals[1] += unrealized
+        tickers = []
+        for ticker in sorted(set(held) | set(scores)):
+            score = scores.get(ticker)
+            tickers.append((ticker, self.prices.prices.get(ticker), *held.get(ticker, (0.0, 0.0)),
+                            None if score is None or score != score else score))
+        recorded = self.history.record(timestamp, self.ledger.total_value(self.budget), self.budget,
+                                       summary['realized'], summary['unrealized'], summary['exposure'], tickers)
+        self.commit()
+        return recorded
+
+    def equity_curve(self, start=None, end=None, resolution=None):
+        # Stored snapshots oldest first, or their 1m/1h/1d rollups, see TimeSeriesStore.equity
+        return self.history.equity(start, end, resolution)
+
     def get_current_price_one_unit(self, ticker):
-        stock = yf.Ticker(ticker).history(period='1d', interval='1m')
-        return stock['Close'].iloc[-1]
+        return self.prices.get(ticker)
+
+    def held_tickers(self):
+        return self.book.tickers()
+
+    def refresh_prices(self, watched=()):
+        # Single bulk quote fetch per cycle, shared by every price lookup below
+        self.prices.refresh(list(watched) + self.held_tickers())
+
+    def migrate(self):
+        # Steps run once per database file, PRAGMA user_version records the last one applied
+        version = self.cur.execute('''PRAGMA user_version''').fetchone()[0]
+        if version < 1:
+            self.add_short_entry_price()
+        if version < 2:
+            self.cur.execute('''CREATE INDEX IF NOT EXISTS portfolio_ticker ON portfolio (ticker, quantity)''')
+            self.cur.execute('''CREATE INDEX IF NOT EXISTS short_positions_ticker ON short_positions (ticker, quantity)''')
+            self.cur.execute('''CREATE INDEX IF NOT EXISTS transactions_ticker ON transactions (ticker, transaction_type, timestamp)''')
+            self.cur.execute('''CREATE INDEX IF NOT EXISTS transactions_timestamp ON transactions (timestamp)''')
+        if version < 3:
+            # Every order the queue has handled, filled or rejected, so a client id is never executed twice
+            self.cur.execute('''CREATE TABLE IF NOT EXISTS orders (
+                                client_id TEXT PRIMARY KEY,
+                                ticker TEXT,
+                                side TEXT,
+                                quantity REAL,
+                                price REAL,
+                                leverage REAL,
+                                status TEXT,
+                                timestamp TEXT)''')
+        if version < 4:
+            # Realized P&L per ledger group, written with every commit
+            self.cur.execute('''CREATE TABLE IF NOT EXISTS realized_pnl (
+                                ticker TEXT,
+                                side TEXT,
+                                leverage REAL,
+                                amount REAL,
+                                PRIMARY KEY (ticker, side, leverage))''')
+            # Per-cycle valuations for equity curves, see timeseries_store
+            self.cur.execute('''CREATE TABLE IF NOT EXISTS cycle_snapshots (
+                                ts INTEGER PRIMARY KEY,
+                                total_value REAL,
+                                budget REAL,
+                                realized REAL,
+                                unrealized REAL,
+                                exposure REAL)''')
+        if version < 5:
+            self.create_history_tables()
+            # Snapshots recorded at version 4 are rolled up too
+            self.history.rebuild_rollups()
+        self.cur.execute(f'''PRAGMA user_version={SCHEMA_VERSION}''')
+
+    def create_history_tables(self):
+        # Per-ticker snapshots and the rollups, see timeseries_store: epoch-second keys, clustered on the primary key
+        self.cur.execute('''CREATE TABLE IF NOT EXISTS ticker_snapshots (
+                            ticker TEXT,
+                            ts INTEGER,
+                            price REAL,
+                            exposure REAL,
+                            unrealized REAL,
+                            score REAL,
+                            PRIMARY KEY (ticker, ts)) WITHOUT ROWID''')
+        self.cur.execute('''CREATE TABLE IF NOT EXISTS equity_rollups (
+                            resolution INTEGER,
+                            bucket INTEGER,
+                            open REAL,
+                            high REAL,
+                            low REAL,
+                            close REAL,
+                            samples INTEGER,
+                            PRIMARY KEY (resolution, bucket)) WITHOUT ROWID''')
+        self.cur.execute('''CREATE TABLE IF NOT EXISTS ticker_rollups (
+                            resolution INTEGER,
+                            ticker TEXT,
+                            bucket INTEGER,
+                            price REAL,
+                            exposure REAL,
+                            unrealized REAL,
+                            score_sum REAL,
+                            scores INTEGER,
+                            samples INTEGER,
+                            PRIMARY KEY (resolution, ticker, bucket)) WITHOUT ROWID''')
+
+    def add_short_entry_price(self):
+        # Databases created before short_positions had entry_price: backfill it from the short transactions
+        columns = [row[1] for row in self.cur.execute('''PRAGMA table_info(short_positions)''')]
+        if 'entry_price' in columns:
+            return
+        self.cur.execute('''ALTER TABLE short_positions ADD COLUMN entry_price REAL''')
+        self.cur.execute('''UPDATE short_positions SET entry_price=(
+                                SELECT price FROM transactions
+                                WHERE transactions.ticker=short_positions.ticker AND transaction_type='short'
+                                AND transactions.quantity=short_positions.quantity
+                                ORDER BY timestamp DESC LIMIT 1)''')
+
+    def record_transaction(self, ticker, quantity, price, transaction_type, timestamp, leverage):
+        self.pending_transactions.append((ticker, quantity, price, transaction_type, timestamp, leverage))
+
+    @metrics.timed('db.commit')
+    def commit(self):
+        # Inside a transaction() block the commit is left to the end of the block
+        if self.transaction_depth:
+            return
+        self.cur.executemany('''INSERT INTO transactions 
+                                (ticker, quantity, price, transaction_type, timestamp, leverage) 
+                                VALUES (?, ?, ?, ?, ?, ?)''', self.pending_transactions)
+        self.pending_transactions = []
+        self.cur.executemany('''INSERT INTO realized_pnl (ticker, side, leverage, amount) VALUES (?, ?, ?, ?)
+                                ON CONFLICT (ticker, side, leverage) DO UPDATE SET amount=excluded.amount''', self.ledger.flush())
+        self.conn.commit()
+
+    @contextmanager
+    def transaction(self):
+        # Groups every write, e.g. a whole trading cycle, into a single SQLite transaction. A block
+        # that starts after another connection committed first reloads the book it would act on.
+        if not self.transaction_depth and self.cur.execute('''PRAGMA data_version''').fetchone()[0] != self.data_version:
+            self.load_book()
+        self.transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.transaction_depth -= 1
+            if not self.transaction_depth:
+                self.pending_transactions = []
+                with metrics.stage('db.rollback'):
+                    self.conn.rollback()
+                self.load_book()
+            raise
+        self.transaction_depth -= 1
+        self.commit()
 
     def __del__(self):
         self.conn.close()
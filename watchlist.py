@@ -0,0 +1,17 @@
+import os
+
+# Tickers traded by main.py and supervisor.py, with the colour they are printed in.
+# WATCHLIST (comma-separated tickers) replaces the list, e.g. for large sharded runs.
+companies = [
+    {'ticker': 'BTC-EUR', 'color': 'yellow'},
+    {'ticker': 'ETH-EUR', 'color': 'light_magenta'},
+    {'ticker': 'SOL-EUR', 'color': 'light_cyan'},
+    {'ticker': 'DOGE-EUR', 'color': 'dark_grey'},
+    {'ticker': 'LTC-EUR', 'color': 'white'}
+]
+
+if os.environ.get('WATCHLIST'):
+    companies = [{'ticker': ticker.strip(), 'color': 'white'} for ticker in os.environ['WATCHLIST'].split(',') if ticker.strip()]
+
+tickers = [company['ticker'] for company in companies]
+colors = {company['ticker']: company['color'] for company in companies}